@@ -50,6 +50,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'visualSHARK.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -148,6 +149,10 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'visualSHARK.util.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.LimitOffsetPagination',
     'PAGE_SIZE': 100,
     'STRICT_JSON': False
@@ -157,6 +162,57 @@ VERSION = '0.1.0'
 
 COMPUTED_FILES = 'computed_files/'
 
+# typed feature matrices of the products used for prediction
+FEATURE_CACHE = os.path.normpath(BASE_DIR + '/computed_files/features/')
+
+# fitted prediction models, evicted least recently used first if the store grows larger than max_size bytes
+MODEL_STORE = {
+    'folder': os.path.normpath(BASE_DIR + '/computed_files/models/'),
+    'max_size': 1024 * 1024 * 1024,
+}
+
+# loaded LDA models and dictionaries are kept per process, least recently used ones are dropped above cache_size bytes
+# the files of the models are stored in folder, least recently used ones are removed above max_size bytes
+TOPIC_MODELS = {
+    'cache_size': 1024 * 1024 * 512,
+    'folder': os.path.normpath(BASE_DIR + '/tmp/'),
+    'max_size': 1024 * 1024 * 1024 * 4,
+    'preprocess_jobs': 4,  # processes used to preprocess texts for batch inference
+    'diff_jobs': 4,  # processes used to compare topic models
+}
+
+# precomputed topic distributions of issues and messages per TopicModel
+TOPIC_STORE = os.path.normpath(BASE_DIR + '/computed_files/topics/')
+
+# pairwise topic diff matrices between the TopicModels of a project
+TOPIC_DIFFS = os.path.normpath(BASE_DIR + '/computed_files/topicdiffs/')
+
+# rows of the topic matrix compared at once in similarity searches
+TOPIC_SIMILARITY_BLOCK_SIZE = 1024 * 64
+
+# upper limit for the number of processes used to compare prediction models in one request
+PREDICTION_MAX_JOBS = 4
+
+# response compression, brotli is only used if the brotli module is installed
+COMPRESSION = {
+    'min_size': 1024 * 4,  # bytes, smaller responses are not compressed
+    'gzip_level': 6,
+    'brotli_quality': 5,
+}
+
+# chunk size used when streaming files from the storage or GridFS
+STREAM_CHUNK_SIZE = 1024 * 64
+
+# streaming bulk exports, batch size of the mongodb cursors and of the chunks we send
+EXPORT = {
+    'batch_size': 1000,
+    'max_batch_size': 10000,
+    'row_group_size': 50000,  # rows per parquet row group / arrow record batch
+}
+
+# max-age of conditional responses (commit graph, products, releases, stats), 0 means the client always revalidates
+CONDITIONAL_MAX_AGE = 0
+
 
 LOGGING = {
     'version': 1,
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from visualSHARK.models import Project, IssueSystem, Issue
+from visualSHARK.util import text
+
+
+class Command(BaseCommand):
+    """Compares the topic model text preprocessing with the legacy implementation on the issues of a project."""
+
+    help = 'Benchmark text preprocessing for topic inference'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', help='which project')
+        parser.add_argument('--limit', type=int, default=1000, help='number of issues')
+        parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best is reported')
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(name__iexact=options['project'])
+        systems = [s.id for s in IssueSystem.objects.filter(project_id=project.id).only('id')]
+        texts = [text.issue_text(i) for i in Issue.objects.filter(issue_system_id__in=systems).only('title', 'desc').limit(options['limit'])]
+        if not texts:
+            raise CommandError('no issues for project {}'.format(project.name))
+
+        legacy = [text.preprocess_legacy(s) for s in texts]
+        text._token.cache_clear()
+        start = timeit.default_timer()
+        fast = [text.preprocess(s) for s in texts]
+        cold = timeit.default_timer() - start
+
+        if fast != legacy:
+            different = sum(1 for a, b in zip(fast, legacy) if a != b)
+            raise CommandError('{} of {} texts are preprocessed differently'.format(different, len(texts)))
+        self.stdout.write(self.style.SUCCESS('[OK]') + ' Identical tokens for {} issues'.format(len(texts)))
+
+        for name, func in (('legacy', text.preprocess_legacy), ('fast', text.preprocess)):
+            best = min(timeit.repeat(lambda: [func(s) for s in texts], number=1, repeat=options['repeat']))
+            self.stdout.write(self.style.SUCCESS('[OK]') + ' {}: {:.3f}s ({:.3f}ms per issue)'.format(name, best, best * 1000 / len(texts)))
+        self.stdout.write(self.style.SUCCESS('[OK]') + ' fast without lemma cache: {:.3f}s'.format(cold))
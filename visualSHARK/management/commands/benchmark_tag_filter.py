@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from visualSHARK.models import Project, VCSSystem, Tag
+from visualSHARK.util import helper
+
+
+class Command(BaseCommand):
+    """Compares the version parser of tag_filter with the legacy implementation on the tags of a project."""
+
+    help = 'Benchmark tag version parsing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', help='which project')
+        parser.add_argument('--repeat', type=int, default=3, help='number of runs, the best is reported')
+
+    def handle(self, *args, **options):
+        project = Project.objects.get(name__iexact=options['project'])
+        vcs = VCSSystem.objects.get(project_id=project.id)
+        names = [t['name'] for t in Tag.objects.filter(vcs_system_id=vcs.id).only('name').as_pymongo()]
+        if not names:
+            raise CommandError('no tags for project {}'.format(project.name))
+
+        different = [n for n in names if helper.parse_version(n) != helper.parse_version_legacy(n)]
+        if different:
+            raise CommandError('{} of {} tags are parsed differently, e.g., {}'.format(len(different), len(names), different[:5]))
+        self.stdout.write(self.style.SUCCESS('[OK]') + ' Identical versions for {} tags'.format(len(names)))
+
+        for name, func in (('legacy', helper.parse_version_legacy), ('fast', helper.parse_version)):
+            best = min(timeit.repeat(lambda: [func(n) for n in names], number=1, repeat=options['repeat']))
+            self.stdout.write(self.style.SUCCESS('[OK]') + ' {}: {:.3f}s ({:.3f}us per tag)'.format(name, best, best * 1000000 / len(names)))
@@ -10,6 +10,7 @@ from django.core.management.base import BaseCommand
 from django.core.files import File as DFile
 
 from visualSHARK.models import CommitGraph, VCSSystem, Commit, Project, FileAction, File, Tag
+from visualSHARK.util.compression import precompress
 
 import networkx as nx
 from networkx.drawing.nx_agraph import graphviz_layout
@@ -142,5 +143,8 @@ class Command(BaseCommand):
         # safe json file in CommitGraph
         cg.directed_graph.save(name=directed_json_name, content=DFile(open(directed_json_path, 'r')))
         cg.save()
+
+        # compress once here instead of on every request
+        precompress(cg.directed_graph.path)
         end = timeit.default_timer() - start
         self.stdout.write(self.style.SUCCESS('[OK]') + ' Finished in {:.3f}s '.format(end))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from visualSHARK.models import VCSSystem, Project
+from visualSHARK.util import columnar
+
+
+class Command(BaseCommand):
+    """Writes the CodeEntityState metrics of a commit or a commit range as columnar Parquet or Arrow file."""
+
+    help = 'Export CodeEntityState metrics as Parquet / Arrow'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project', help='which project')
+        parser.add_argument('commit', help='revision hash of the (start) commit')
+        parser.add_argument('file', help='output file')
+        parser.add_argument('--end-commit', help='revision hash of the end commit, exports all commits in between')
+        parser.add_argument('--output', choices=sorted(columnar.OUTPUTS.keys()), default='parquet', help='file format')
+        parser.add_argument('--row-group-size', type=int, default=settings.EXPORT['row_group_size'], help='rows per row group / record batch')
+
+    def handle(self, *args, **options):
+        if columnar.pa is None:
+            raise CommandError('pyarrow is required for columnar exports')
+
+        start = timeit.default_timer()
+        project = Project.objects.get(name__iexact=options['project'])
+        vcs = VCSSystem.objects.get(project_id=project.id)
+
+        commit_ids = columnar.commit_range(vcs.id, options['commit'], options['end_commit'])
+        self.stdout.write(self.style.SUCCESS('[OK]') + ' Exporting metrics of {} commits for Project {}'.format(len(commit_ids), project.name))
+
+        with open(options['file'], 'wb') as f:
+            rows = columnar.write_metrics(f, commit_ids, options['output'], options['row_group_size'])
+
+        end = timeit.default_timer() - start
+        self.stdout.write(self.style.SUCCESS('[OK]') + ' Wrote {} rows in {:.3f}s '.format(rows, end))
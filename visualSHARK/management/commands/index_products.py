@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from visualSHARK.models import MynbouData
+from visualSHARK.util import products
+
+
+class Command(BaseCommand):
+    """Populates the ProductMetadata index for the mynbouSHARK products so that no request has to read a product file for it."""
+
+    help = 'Index mynbouSHARK product metadata'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vcs-system-id', help='only index products of this vcs system')
+        parser.add_argument('--force', action='store_true', help='re-index products which are up to date')
+
+    def handle(self, *args, **options):
+        start = timeit.default_timer()
+
+        qry = MynbouData.objects.only('id', 'last_updated', 'vcs_system_id', 'name', 'file')
+        if options['vcs_system_id']:
+            qry = qry.filter(vcs_system_id=options['vcs_system_id'])
+
+        for p in qry:
+            meta = products.build_metadata(p) if options['force'] else products.metadata(p)
+            self.stdout.write(self.style.SUCCESS('[OK]') + ' {}: {} rows, {} columns'.format(meta.name, meta.rows, len(meta.column_list)))
+
+        end = timeit.default_timer() - start
+        self.stdout.write(self.style.SUCCESS('[OK]') + ' Finished in {:.3f}s '.format(end))
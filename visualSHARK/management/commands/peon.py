@@ -8,6 +8,7 @@ from django.utils import timezone
 
 from visualSHARK.models import VSJob
 from visualSHARK.util.remote import RemoteShark
+from visualSHARK.util import prediction, features, modelstore, topicdiff
 
 
 class Command(BaseCommand):
@@ -40,6 +41,10 @@ class Command(BaseCommand):
         elif dat['job_type'] == 'test_connection_servershark':
             r = RemoteShark(dat['data']['api_url'], dat['data']['api_key'], dat['data']['substitutions'])
             res, msg = r.test_connection(dat['data'])
+        elif dat['job_type'] in ('predict', 'predict_evaluate'):
+            res, msg = self.predict(dat['job_type'], dat['data'])
+        elif dat['job_type'] == 'compare_topic_models':
+            res, msg = self.compare_topic_models(dat['data'])
 
         # get job save result
         job = VSJob.objects.get(pk=dat['job_id'])
@@ -52,6 +57,26 @@ class Command(BaseCommand):
         # acknowledge job
         # channel.basic_ack(delivery_tag=method_frame.delivery_tag)
 
+    def predict(self, job_type, data):
+        """Fit the model on the training products and predict / evaluate the test products."""
+        try:
+            fitted = modelstore.fitted(data['training'].split(','), data['model'], chunk_size=data.get('chunk_size', None))
+            test = features.load_products(data['test'].split(','))
+            if job_type == 'predict':
+                return True, prediction.apply(fitted, test, probabilities=data.get('probabilities', False))
+            return True, prediction.evaluate(fitted, test)
+        except Exception as e:
+            self.stderr.write('job {} failed: {}'.format(job_type, e))
+            return False, {'msg': str(e)}
+
+    def compare_topic_models(self, data):
+        """Compute the missing topic diff matrices between the TopicModels of a project."""
+        try:
+            return True, topicdiff.compare_project(data['project_id'], data.get('distance', 'jensen_shannon'), settings.TOPIC_MODELS['diff_jobs'])
+        except Exception as e:
+            self.stderr.write('job compare_topic_models failed: {}'.format(e))
+            return False, {'msg': str(e)}
+
     def handle(self, *args, **options):
         credentials = pika.PlainCredentials(settings.QUEUE['user'], settings.QUEUE['password'])
         parameters = pika.ConnectionParameters(settings.QUEUE['server'], int(settings.QUEUE['port']), settings.QUEUE['vhost'], credentials, ssl=settings.QUEUE['ssl'])
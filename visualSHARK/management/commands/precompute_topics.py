@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import timeit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from visualSHARK.models import TopicModel
+from visualSHARK.util import topicstore
+
+
+class Command(BaseCommand):
+    """Infers the topic distributions of all issues (and messages) of the project of a TopicModel and stores them.
+
+    Subsequent runs only process documents which were added since the last run.
+    """
+
+    help = 'Precompute topic distributions for a TopicModel'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model_id', help='id of the TopicModel')
+        parser.add_argument('--messages', action='store_true', help='also process the messages of the project')
+        parser.add_argument('--full', action='store_true', help='recompute everything instead of only new documents')
+        parser.add_argument('--batch-size', type=int, default=1000, help='documents per inference batch')
+
+    def handle(self, *args, **options):
+        start = timeit.default_timer()
+        model = TopicModel.objects.get(id=options['model_id'])
+
+        kinds = topicstore.KINDS if options['messages'] else ('issue',)
+        for kind in kinds:
+            count = topicstore.update(model, kind, full=options['full'], batch_size=options['batch_size'], n_jobs=settings.TOPIC_MODELS['preprocess_jobs'])
+            self.stdout.write(self.style.SUCCESS('[OK]') + ' {} new {} topic distributions for {}'.format(count, kind, model.name))
+
+        end = timeit.default_timer() - start
+        self.stdout.write(self.style.SUCCESS('[OK]') + ' Finished in {:.3f}s '.format(end))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from visualSHARK.util.compression import choose_encoding, compress, compress_sequence
+
+
+# these are already compressed, we would only burn cpu
+INCOMPRESSIBLE_TYPES = ('application/gzip', 'application/zip', 'application/octet-stream', 'image/')
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Compresses responses with brotli or gzip, depending on what the client accepts.
+
+    Like the GZipMiddleware of django this needs to be placed before every middleware which reads or writes the response body.
+    Responses smaller than COMPRESSION['min_size'] are not worth it and sent as is.
+    """
+
+    def process_response(self, request, response):
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return response
+
+        # byte ranges refer to the uncompressed file
+        if response.has_header('Accept-Ranges'):
+            return response
+
+        if response.get('Content-Type', '').startswith(INCOMPRESSIBLE_TYPES):
+            return response
+
+        # streaming responses only tell us their size if they set it explicitly
+        if response.streaming:
+            size = int(response.get('Content-Length', settings.COMPRESSION['min_size']))
+        else:
+            size = len(response.content)
+        if size < settings.COMPRESSION['min_size']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = choose_encoding(request)
+        if not encoding:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_sequence(response.streaming_content, encoding)
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        # the compressed representation is not byte-identical anymore
+        if response.has_header('ETag'):
+            response['ETag'] = re.sub(r'^"', 'W/"', response['ETag'])
+
+        response['Content-Encoding'] = encoding
+        return response
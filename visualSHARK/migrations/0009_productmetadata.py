@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualSHARK', '0008_prediction_job_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductMetadata',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mynbou_id', models.CharField(max_length=255, unique=True)),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+                ('vcs_system_id', models.CharField(max_length=255)),
+                ('name', models.CharField(max_length=255)),
+                ('label_path_approach', models.CharField(blank=True, max_length=255, null=True)),
+                ('start_commit', models.CharField(blank=True, max_length=255, null=True)),
+                ('end_commit', models.CharField(blank=True, max_length=255, null=True)),
+                ('rows', models.IntegerField(default=0)),
+                ('columns', models.TextField(default='[]')),
+                ('size', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+def add_job_types(apps, schema_editor):
+    hjt = apps.get_model("visualSHARK", "VSJobType")
+
+    for t in ['compare_topic_models']:
+        h = hjt()
+        h.name = t
+        h.ident = t
+        h.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualSHARK', '0009_productmetadata'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_job_types),
+    ]
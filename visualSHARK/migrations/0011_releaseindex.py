@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('visualSHARK', '0010_topic_model_job_types'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleaseIndex',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('vcs_system_id', models.CharField(max_length=255, unique=True)),
+                ('fingerprint', models.CharField(max_length=255)),
+                ('versions', models.TextField(default='[]')),
+                ('last_updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -130,6 +130,47 @@ class CommitGraph(models.Model):
         return self.title
 
 
+class ProductMetadata(models.Model):
+    """Contains the metadata of a mynbouSHARK product so that listings and paths do not need to read the product file.
+
+    Entries are created on first access or with the index_products command and are outdated once
+    last_updated of the MynbouData changes.
+    """
+
+    mynbou_id = models.CharField(max_length=255, unique=True)
+    last_updated = models.DateTimeField(blank=True, null=True)
+    vcs_system_id = models.CharField(max_length=255)
+    name = models.CharField(max_length=255)
+    label_path_approach = models.CharField(max_length=255, blank=True, null=True)
+    start_commit = models.CharField(max_length=255, blank=True, null=True)
+    end_commit = models.CharField(max_length=255, blank=True, null=True)
+    rows = models.IntegerField(default=0)
+    columns = models.TextField(default='[]')  # jsonized list of column names
+    size = models.BigIntegerField(default=0)
+
+    @property
+    def column_list(self):
+        return json.loads(self.columns)
+
+    def __str__(self):
+        return self.name
+
+
+class ReleaseIndex(models.Model):
+    """Contains the parsed versions of the tags of a VCS system without fliers, used for the release list.
+
+    The index is rebuilt if the fingerprint (number of tags, newest tag and last update of the VCS system) changes.
+    """
+
+    vcs_system_id = models.CharField(max_length=255, unique=True)
+    fingerprint = models.CharField(max_length=255)
+    versions = models.TextField(default='[]')  # jsonized list of versions
+    last_updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.vcs_system_id
+
+
 class CommitLabelField(models.Model):
     """Contains currently available commit labels from labelSHARK.
 
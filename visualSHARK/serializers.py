@@ -9,7 +9,7 @@ from rest_framework import serializers as rserializers
 # from rest_framework import fields as rfields
 
 from .models import Commit, Project, VCSSystem, IssueSystem, FileAction, Tag, CodeEntityState, Issue, Message, People, MailingList, File, MynbouData
-from .models import CommitGraph, CommitLabelField, VSJob, VSJobType
+from .models import CommitGraph, CommitLabelField, VSJob, VSJobType, ProductMetadata
 
 
 class CommitLabelFieldSerializer(rserializers.ModelSerializer):
@@ -191,6 +191,14 @@ class ProductSerializer(serializers.DocumentSerializer):
         fields = ('id', 'vcs_system_id', 'name', 'file', 'path_approach', 'bugfix_label', 'metric_approach', 'last_updated')
 
 
+class ProductMetadataSerializer(rserializers.ModelSerializer):
+    columns = rserializers.ListField(source='column_list', read_only=True)
+
+    class Meta:
+        model = ProductMetadata
+        fields = ('mynbou_id', 'vcs_system_id', 'name', 'last_updated', 'label_path_approach', 'start_commit', 'end_commit', 'rows', 'columns', 'size')
+
+
 class VSJobTypeSerializer(rserializers.ModelSerializer):
 
     class Meta:
@@ -1,9 +1,23 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import unittest
 from datetime import datetime
 
-from django.test import TestCase
+import numpy as np
+import scipy.sparse as sp
+
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
 from pymongo import MongoClient
 
 from visualSHARK.models import Project
+from visualSHARK.util import columnar, compression, export, features, modelstore, prediction, text, topicstore
+from visualSHARK.util.conditional import conditional
+from visualSHARK.util.helper import discard_fliers, parse_version, parse_version_legacy
+from visualSHARK.util.responses import file_response, parse_range, spliced_json_response
 
 
 class GraphTests(TestCase):
@@ -22,3 +36,377 @@ class GraphTests(TestCase):
     def test_projects(self):
         np = len(Project.objects.all())
         self.assertEqual(np, 1)
+
+
+class VersionParserTests(TestCase):
+
+    # tag names as they occur in our projects
+    tags = ['rel/commons-lang-3.4', 'LANG_3_0_RC1', 'LANG_2_6', 'commons-math-3.6.1-RC2', 'MATH_1_0_BETA', 'release-1.2.3',
+            'v2.0.0-beta.1', 'ant-1.9.4', 'ANT_170_B2', 'BEFORE_MERGE', '1.0b3', 'jena-2.10.1-rc2', 'release-3.4.5', 'derby-10.11.1.1',
+            'pig-0.12.0-rc0', 'hadoop-2.7.0-alpha', 'KAFKA_0.8.2_RC1', 'DEV_2_0_2', 'nutch-1.10', 'Release_1_2_alpha', 'v1.0',
+            'svn-tag-1.x', 'tika-1.9-rc1', 'opennlp-1.6.0-rc6', 'ALPHA_1', 'nightly-20171204', 'alphalpha1', 'rcrc2', 'b', '',
+            'version 1 2', 'ver-\u0661.\u0662', '\u00c4rger-1.0']
+
+    def test_identical_to_legacy(self):
+        for tag in self.tags:
+            self.assertEqual(parse_version(tag), parse_version_legacy(tag), tag)
+
+    def test_parse_version(self):
+        self.assertEqual(parse_version('LANG_3_0_RC1'), ([3, 0, 0], ['rc', '1']))
+        self.assertEqual(parse_version('release-10.11.1.1'), ([10, 11, 1, 1], ''))
+        self.assertEqual(parse_version('MATH_1_0_BETA'), ([1, 0, 0], ['beta']))
+        self.assertEqual(parse_version('BEFORE_MERGE'), ([], ['b']))
+
+    def test_discard_fliers_few_versions(self):
+        for majors in ([], [1], [1, 2], [1, 2, 100], [1, 2, 2, 1000]):
+            versions = [{'version': [m, 0, 0]} for m in majors]
+            self.assertEqual(discard_fliers(versions), versions, majors)
+
+    def test_discard_fliers(self):
+        versions = [{'version': [m, 0, 0]} for m in (1, 1, 2, 2, 2, 3, 3, 3, 4, 2017)]
+        self.assertEqual(discard_fliers(versions), versions[:-1])
+        versions = [{'version': [m, 0, 0]} for m in (1, 1, 2, 3, 4)]
+        self.assertEqual(discard_fliers(versions), versions)
+
+
+class CompressionTests(TestCase):
+
+    def _request(self, accept_encoding):
+        return RequestFactory().get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+
+    def test_accepted_encodings(self):
+        accepted, refused = compression.accepted_encodings(self._request('gzip;q=0.5, BR , identity;q=0, deflate;q=x'))
+        self.assertEqual(accepted, {'gzip', 'br'})
+        self.assertEqual(refused, {'identity'})
+
+    def test_choose_encoding(self):
+        self.assertEqual(compression.choose_encoding(self._request('gzip')), 'gzip')
+        self.assertEqual(compression.choose_encoding(self._request('gzip, br')), compression.ENCODINGS[0])
+        self.assertIsNone(compression.choose_encoding(self._request('')))
+        self.assertIsNone(compression.choose_encoding(self._request('gzip;q=0')))
+
+    def test_wildcard_does_not_match_refused(self):
+        self.assertEqual(compression.choose_encoding(self._request('*'), available=('gzip',)), 'gzip')
+        self.assertIsNone(compression.choose_encoding(self._request('gzip;q=0, *'), available=('gzip',)))
+        self.assertIsNone(compression.choose_encoding(self._request('*, gzip;q=0'), available=('gzip',)))
+        self.assertEqual(compression.choose_encoding(self._request('br;q=0, *'), available=('br', 'gzip')), 'gzip')
+
+
+class ConditionalTests(TestCase):
+
+    last_modified = datetime(2018, 1, 2, 3, 4, 5)
+
+    def _view(self, content_encoding=None):
+        def version(view, request):
+            return 'v1', self.last_modified
+
+        @conditional(version)
+        def get(view, request):
+            response = HttpResponse('artifact')
+            if content_encoding:
+                response['Content-Encoding'] = content_encoding
+            return response
+        return get
+
+    def test_not_modified(self):
+        view = self._view()
+        response = view(None, RequestFactory().get('/stats/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response['ETag'].startswith('W/'))
+        self.assertEqual(response['Last-Modified'], 'Tue, 02 Jan 2018 03:04:05 GMT')
+
+        revalidated = view(None, RequestFactory().get('/stats/', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['ETag'], response['ETag'])
+
+        revalidated = view(None, RequestFactory().get('/stats/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified']))
+        self.assertEqual(revalidated.status_code, 304)
+
+        # the query string is part of the version
+        other = view(None, RequestFactory().get('/stats/?page=2', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(other.status_code, 200)
+        self.assertNotEqual(other['ETag'], response['ETag'])
+
+    def test_weak_etag_for_content_encoding(self):
+        plain = self._view()(None, RequestFactory().get('/stats/'))
+        response = self._view('gzip')(None, RequestFactory().get('/stats/'))
+        self.assertEqual(response['ETag'], 'W/' + plain['ETag'])
+
+        revalidated = self._view('gzip')(None, RequestFactory().get('/stats/', HTTP_IF_NONE_MATCH=response['ETag']))
+        self.assertEqual(revalidated.status_code, 304)
+
+
+class RangeTests(TestCase):
+
+    def test_parse_range(self):
+        self.assertIsNone(parse_range(None, 10))
+        self.assertIsNone(parse_range('bytes=-', 10))
+        self.assertEqual(parse_range('bytes=2-4', 10), (2, 4))
+        self.assertEqual(parse_range('bytes=-3', 10), (7, 9))
+        self.assertEqual(parse_range('bytes=-20', 10), (0, 9))
+        self.assertEqual(parse_range('bytes=5-', 10), (5, 9))
+        self.assertEqual(parse_range('bytes=5-100', 10), (5, 9))
+        self.assertIsNone(parse_range('bytes=5-2', 10))
+        self.assertIsNone(parse_range('bytes=0-1,3-4', 10))
+        for header, size in (('bytes=10-', 10), ('bytes=10-12', 10), ('bytes=-0', 10), ('bytes=0-', 0)):
+            with self.assertRaises(ValueError, msg=header):
+                parse_range(header, size)
+
+    def _download(self, **headers):
+        def version(view, request):
+            return 'v1', datetime(2018, 1, 2, 3, 4, 5)
+
+        @conditional(version)
+        def get(view, request):
+            return file_response(request, io.BytesIO(b'0123456789'), 10, 'application/json', 'product.json')
+        return get(None, RequestFactory().get('/products/1/file_download/', **headers))
+
+    def test_file_response(self):
+        response = self._download(HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'234')
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+        self.assertIn('ETag', response)
+
+        response = self._download(HTTP_RANGE='bytes=10-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range(self):
+        full = self._download()
+        self.assertEqual(b''.join(full.streaming_content), b'0123456789')
+
+        for if_range in (full['ETag'], full['Last-Modified']):
+            response = self._download(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=if_range)
+            self.assertEqual(response.status_code, 206, if_range)
+
+        for if_range in ('"outdated"', 'W/' + full['ETag'], 'Mon, 01 Jan 2018 00:00:00 GMT'):
+            response = self._download(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=if_range)
+            self.assertEqual(response.status_code, 200, if_range)
+            self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+
+class SplicedJSONTests(TestCase):
+
+    graph = json.dumps({'nodes': [{'id': 'abc', 'x': 1.5, 'label': 'caf\u00e9'}], 'edges': []}, ensure_ascii=False).encode('utf-8')
+
+    def _content(self, envelope):
+        response = spliced_json_response(envelope, 'directed_graph', io.BytesIO(self.graph), len(self.graph), chunk_size=7)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        return json.loads(content.decode('utf-8'))
+
+    def test_splice(self):
+        envelope = {'id': 1, 'vcs_system_id': '5a0b', 'title': 'graph'}
+        data = self._content(envelope)
+        self.assertEqual(data['directed_graph'], json.loads(self.graph.decode('utf-8')))
+        self.assertEqual({k: data[k] for k in envelope}, envelope)
+
+    def test_empty_envelope(self):
+        self.assertEqual(self._content({}), {'directed_graph': json.loads(self.graph.decode('utf-8'))})
+
+
+class ExportTests(TestCase):
+
+    def _documents(self):
+        return [{'_id': i, 'revision_hash': 'r{}'.format(i), 'parents': ['r{}'.format(i - 1)] if i else [], 'message': 'line, "quoted"\nnext'}
+                for i in range(5)]
+
+    def test_ndjson_lines(self):
+        chunks = list(export.ndjson_lines(self._documents(), 2))
+        self.assertEqual(len(chunks), 3)
+        lines = b''.join(chunks).decode('utf-8').splitlines()
+        self.assertEqual([json.loads(l)['id'] for l in lines], list(range(5)))
+        self.assertNotIn('_id', json.loads(lines[0]))
+
+    def test_csv_lines(self):
+        fields = ('id', 'revision_hash', 'parents', 'message', 'labels')
+        chunks = list(export.csv_lines(self._documents(), fields, 2))
+        rows = list(csv.reader(io.StringIO(b''.join(chunks).decode('utf-8'))))
+        self.assertEqual(rows[0], list(fields))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[2], ['1', 'r1', '["r0"]', 'line, "quoted"\nnext', ''])
+
+class ProductMatrixTests(TestCase):
+
+    rows = [{'long_name': 'org.A', 'bugs': 0, 'label': False, 'LOC': 10, 'method_HCPL': 1},
+            {'long_name': 'org.B', 'bugs': 2, 'label': True, 'LOC': 30, 'McCC': 4},
+            {'long_name': 'org.sub.C', 'bugs': 1, 'label': True, 'LOC': None, 'McCC': 2}]
+
+    def test_from_rows(self):
+        m = features.ProductMatrix.from_rows(iter(self.rows))
+        self.assertEqual(len(m), 3)
+        self.assertEqual(m.columns, ['LOC', 'McCC'])
+        np.testing.assert_array_equal(m.data, [[10, np.nan], [30, 4], [np.nan, 2]])
+        self.assertEqual(m.bugs.dtype, np.int64)
+        self.assertEqual(m.row(0), {'long_name': 'org.A', 'bugs': 0, 'label': False, 'LOC': 10.0, 'McCC': None})
+
+        m = features.ProductMatrix.from_rows(self.rows + [{'long_name': 'org.D', 'LOC': 1}])
+        self.assertTrue(np.isnan(m.bugs[3]))
+        self.assertEqual(m.row(3)['bugs'], None)
+
+    def test_save_load(self):
+        m = features.ProductMatrix.from_rows(self.rows)
+        with tempfile.TemporaryDirectory() as folder:
+            m.save(folder)
+            loaded = features.ProductMatrix.load(folder, mmap_mode='r')
+            self.assertEqual(loaded.columns, m.columns)
+            self.assertEqual([loaded.row(i) for i in range(len(loaded))], [m.row(i) for i in range(len(m))])
+            del loaded
+
+    def test_select(self):
+        m = features.ProductMatrix.from_rows(self.rows)
+        self.assertEqual(m.select().tolist(), [0, 1, 2])
+        self.assertEqual(m.select(long_name='org.sub').tolist(), [2])
+        self.assertEqual(m.select(label=True).tolist(), [1, 2])
+        self.assertEqual(m.select(bugs_gt=0, ordering='bugs').tolist(), [2, 1])
+        self.assertEqual(m.select(ordering='LOC').tolist(), [0, 1, 2])
+        self.assertEqual(m.select(label=True, ordering='McCC').tolist(), [2, 1])
+        self.assertEqual(m.select(ordering='-long_name').tolist(), [2, 1, 0])
+        with self.assertRaises(ValueError):
+            m.select(ordering='unknown')
+
+
+class PredictionValidationTests(TestCase):
+
+    def test_valid(self):
+        prediction.validate([{'model': 'RF', 'params': {'n_estimators': 10}}, {'model': 'NB'}], 'kfold', 2)
+
+    def test_invalid(self):
+        invalid = [
+            ({'model': 'RF'}, 'cross_version', 10),
+            (['RF'], 'cross_version', 10),
+            ([{'model': 'SVM'}], 'cross_version', 10),
+            ([{'model': 'RF', 'params': ['n_estimators']}], 'cross_version', 10),
+            ([{'model': 'RF', 'params': {'unknown': 1}}], 'cross_version', 10),
+            ([{'model': 'NB'}], 'kfold', 1),
+        ]
+        for configurations, scheme, folds in invalid:
+            with self.assertRaises(ValueError, msg=str(configurations)):
+                prediction.validate(configurations, scheme, folds)
+
+
+class ModelStoreTests(TestCase):
+
+    def test_eviction_order(self):
+        with tempfile.TemporaryDirectory() as folder:
+            store = modelstore.ModelStore(folder, 3500)
+            for i, key in enumerate(('a', 'b', 'c')):
+                store.put(key, b'x' * 1000)
+                os.utime(os.path.join(folder, '{}.pickle'.format(key)), (1000 * (i + 1), 1000 * (i + 1)))
+
+            # a is used again, b is the least recently used model now
+            self.assertEqual(store.get('a'), b'x' * 1000)
+            store.put('d', b'x' * 1000)
+            self.assertEqual(sorted(os.listdir(folder)), ['a.pickle', 'c.pickle', 'd.pickle'])
+            self.assertIsNone(store.get('b'))
+
+    def test_incompatible_pickle(self):
+        with tempfile.TemporaryDirectory() as folder:
+            store = modelstore.ModelStore(folder, 3500)
+            # classes which do not exist (anymore) in the installed version of the module
+            for key, data in (('a', b'cunknown_module\nModel\n.'), ('b', b'cos\nUnknownModel\n.'), ('c', b'\x80\x04')):
+                with open(os.path.join(folder, '{}.pickle'.format(key)), 'wb') as f:
+                    f.write(data)
+                self.assertIsNone(store.get(key))
+
+    def test_key(self):
+        class Product(object):
+            def __init__(self, id, last_updated):
+                self.id = id
+                self.last_updated = last_updated
+
+        products = [Product('p1', datetime(2018, 1, 1)), Product('p2', None)]
+        key = modelstore.ModelStore.key(products, 'RF', {'n_estimators': 10})
+        self.assertEqual(key, modelstore.ModelStore.key(products[::-1], 'RF', {'n_estimators': 10}))
+        self.assertNotEqual(key, modelstore.ModelStore.key(products, 'RF', {'n_estimators': 20}))
+        self.assertNotEqual(key, modelstore.ModelStore.key(products, 'RF', {'n_estimators': 10}, incremental=True))
+
+
+class TopicSimilarityTests(TestCase):
+
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        dense = rng.rand(50, 8) * (rng.rand(50, 8) > 0.4) + 0.01
+        self.topics = topicstore.Topics('v1', np.array(['{:024x}'.format(i) for i in range(50)]), sp.csr_matrix(dense))
+        self.vector = rng.rand(8)
+
+    def _brute_force(self, metric, k, exclude=None):
+        q = self.vector / self.vector.sum()
+        scores = topicstore.METRICS[metric](self.topics.dense(), q.astype(np.float32))
+        order = [i for i in np.argsort(-scores, kind='mergesort') if i != exclude][:k]
+        return [(str(self.topics.ids[i]), float(scores[i])) for i in order]
+
+    def test_similar(self):
+        for metric in topicstore.METRICS:
+            for k, block_size, exclude in ((5, 7, None), (10, 50, 3), (1, 1, None), (60, 16, 49)):
+                expected = self._brute_force(metric, k, exclude)
+                result = topicstore.similar(self.topics, self.vector, k, metric, exclude, block_size)
+                self.assertEqual([i for i, s in result], [i for i, s in expected], (metric, k, block_size))
+                for (_, a), (_, b) in zip(result, expected):
+                    self.assertAlmostEqual(a, b, places=5)
+
+
+
+def _nltk_data():
+    try:
+        text.preprocess_legacy('data')
+    except LookupError:
+        return False
+    return True
+
+
+@unittest.skipIf(not _nltk_data(), 'nltk stopwords / wordnet data is not installed')
+class PreprocessTests(TestCase):
+
+    # issue texts similar to the ones in our projects
+    texts = [
+        'NullPointerException in FileUtils.copyFile() when the target is a directory',
+        'https://issues.apache.org/jira/browse/LANG-1234\nThe fix for the linked issue is not complete.',
+        'See http://example.org/a?b=c for details\r\nIt\'s broken, isn\'t it?! ... !!! ?? \' .',
+        'Zookeeper zones are lazy: ZZZ zz z Z fizz buzz',
+        'The tests of the commons-math3 release 3.6.1 are failing on Java 9 (JDK-8u151).',
+        'Wolves, leaves and geese were running through the libraries; these are the studies of analyses.',
+        'We don\'t and shouldn\'t; ain\'t it a shame? ... the of and to in is',
+        '\tTabs\tand\rcarriage returns\r\nand unicode caf\u00e9 na\u00efve \u00fcber',
+        '',
+        '   ',
+    ]
+
+    def test_identical_to_legacy(self):
+        for s in self.texts:
+            self.assertEqual(text.preprocess(s), text.preprocess_legacy(s), s)
+
+    def test_preprocess_all(self):
+        self.assertEqual(text.preprocess_all(self.texts), [text.preprocess_legacy(s) for s in self.texts])
+        self.assertEqual(text.preprocess_all(self.texts * 30, n_jobs=2), [text.preprocess_legacy(s) for s in self.texts] * 30)
+
+
+@unittest.skipIf(columnar.pa is None, 'pyarrow is not installed')
+class ColumnarExportTests(TestCase):
+
+    rows = [{'commit_id': 'c{}'.format(i % 3), 'file_id': 'f{}'.format(i), 'long_name': 'org.Class{}'.format(i % 4), 'ce_type': 'class',
+             'metrics': {'LOC': i, 'McCC': i % 5}} for i in range(10)]
+
+    def test_missing_metrics(self):
+        rows = [{'commit_id': 'c0', 'file_id': 'f0', 'long_name': 'org.A', 'ce_type': 'class', 'metrics': None},
+                {'commit_id': 'c0', 'file_id': 'f1', 'long_name': 'org.B', 'ce_type': 'class'}]
+        sink = io.BytesIO()
+        self.assertEqual(columnar.write_rows(sink, rows, ['LOC'], 'parquet'), 2)
+        sink.seek(0)
+        self.assertEqual(columnar.pq.read_table(sink).column('LOC').to_pylist(), [None, None])
+
+    def test_multiple_row_groups(self):
+        for output in ('parquet', 'arrow'):
+            sink = io.BytesIO()
+            count = columnar.write_rows(sink, self.rows, ['LOC', 'McCC'], output, row_group_size=4)
+            self.assertEqual(count, 10)
+
+            sink.seek(0)
+            if output == 'arrow':
+                table = columnar.pa.ipc.open_file(sink).read_all()
+            else:
+                table = columnar.pq.read_table(sink)
+            self.assertEqual(table.num_rows, 10, output)
+            self.assertEqual([str(v) for v in table.column('long_name').to_pylist()], [r['long_name'] for r in self.rows])
+            self.assertEqual(table.column('LOC').to_pylist(), [float(r['metrics']['LOC']) for r in self.rows])
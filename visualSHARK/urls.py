@@ -7,10 +7,10 @@ from rest_framework_mongoengine import routers
 from rest_framework import routers as rrouters
 from rest_framework.documentation import include_docs_urls
 
-from .views import Auth, StatsView
+from .views import Auth, StatsView, ExportView, MetricsExportView
 
 from .views import CommitViewSet, ProjectViewSet, VcsViewSet, IssueSystemViewSet, FileActionViewSet, TagViewSet, CodeEntityStateViewSet, MessageViewSet, PeopleViewSet, IssueViewSet, MailingListViewSet, FileViewSet, ProductViewSet
-from .views import CommitGraphViewSet, StatsHistoryView, CommitLabelFieldViewSet, PredictionEvaluationView, PredictionView, VSJobViewSet, ReleaseView, TopicModelView
+from .views import CommitGraphViewSet, StatsHistoryView, CommitLabelFieldViewSet, PredictionEvaluationView, PredictionView, VSJobViewSet, ReleaseView, TopicModelView, PredictionComparisonView, TopicModelBatchView, TopicModelSimilarityView, TopicModelDiffView
 
 # Routers provide an easy way of automatically determining the URL conf.
 router = routers.DefaultRouter()
@@ -39,11 +39,17 @@ urlpatterns = [
     url(r'^', include(router.urls)),
     url(r'^analytics/', include(rrouter.urls)),
     url(r'^analytics/release/', ReleaseView.as_view()),
+    url(r'^analytics/topicmodelbatch', TopicModelBatchView.as_view()),
+    url(r'^analytics/topicmodelsimilar', TopicModelSimilarityView.as_view()),
+    url(r'^analytics/topicmodeldiff', TopicModelDiffView.as_view()),
     url(r'^analytics/topicmodel', TopicModelView.as_view()),
     url(r'^system/', include(arouter.urls)),
     url(r'^auth/', Auth.as_view()),
     url(r'^stats/', StatsView.as_view()),
+    url(r'^export/metrics/$', MetricsExportView.as_view()),
+    url(r'^export/(?P<collection>\w+)/$', ExportView.as_view()),
     url(r'^analytics/predictevaluate', PredictionEvaluationView.as_view()),
+    url(r'^analytics/predictcompare', PredictionComparisonView.as_view()),
     url(r'^analytics/predict', PredictionView.as_view()),
     url(r'^statshistory/', StatsHistoryView.as_view()),
     url(r'^docs/', include_docs_urls(title='visualSHARK ReST Documentation', public=False))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from visualSHARK.models import Commit, CodeEntityState
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+
+OUTPUTS = {
+    'parquet': 'application/octet-stream',
+    'arrow': 'application/vnd.apache.arrow.file',
+}
+
+
+def commit_range(vcs_system_id, start_commit, end_commit=None):
+    """Return the ids of the commit or of all commits committed between start and end commit (inclusive)."""
+    start = Commit.objects.only('id', 'committer_date').get(vcs_system_id=vcs_system_id, revision_hash=start_commit)
+    if not end_commit:
+        return [start.id]
+
+    end = Commit.objects.only('id', 'committer_date').get(vcs_system_id=vcs_system_id, revision_hash=end_commit)
+    lo, hi = sorted([start.committer_date, end.committer_date])
+    return [c['_id'] for c in Commit.objects(vcs_system_id=vcs_system_id, committer_date__gte=lo, committer_date__lte=hi).only('id').as_pymongo()]
+
+
+def metric_names(commit_ids):
+    """Collect the names of all metrics in the code entity states of the commits on the server side."""
+    pipeline = [
+        {'$match': {'commit_id': {'$in': commit_ids}}},
+        {'$project': {'m': {'$objectToArray': '$metrics'}}},
+        {'$unwind': '$m'},
+        {'$group': {'_id': '$m.k'}},
+    ]
+    return sorted(d['_id'] for d in CodeEntityState._get_collection().aggregate(pipeline, allowDiskUse=True))
+
+
+def metrics_schema(metrics, dictionary=True):
+    """One column per metric, repetitive strings are dictionary encoded.
+
+    Arrow IPC files allow only one dictionary per field, every record batch would bring its own, so they use plain strings.
+    """
+    text = pa.dictionary(pa.int32(), pa.string()) if dictionary else pa.string()
+    fields = [pa.field('commit_id', text), pa.field('file_id', pa.string()), pa.field('long_name', text), pa.field('ce_type', text)]
+    fields += [pa.field(m, pa.float64()) for m in metrics]
+    return pa.schema(fields)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(schema, name, values):
+    arr = pa.array(values, type=pa.string())
+    if pa.types.is_dictionary(schema.field(name).type):
+        arr = arr.dictionary_encode()
+    return arr
+
+
+def _record_batch(schema, rows, metrics):
+    arrays = [
+        _text(schema, 'commit_id', [str(r['commit_id']) for r in rows]),
+        pa.array([str(r['file_id']) for r in rows]),
+        _text(schema, 'long_name', [r.get('long_name', None) for r in rows]),
+        _text(schema, 'ce_type', [r.get('ce_type', None) for r in rows]),
+    ]
+    for m in metrics:
+        arrays.append(pa.array([_number((r.get('metrics') or {}).get(m, None)) for r in rows], type=pa.float64()))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_rows(sink, rows, metrics, output='parquet', row_group_size=50000):
+    """Write code entity state rows (dicts as returned by as_pymongo) as Parquet or Arrow IPC file to sink.
+
+    Rows are written in row groups / record batches of row_group_size, returns the number of written rows.
+    """
+    schema = metrics_schema(metrics, dictionary=output != 'arrow')
+
+    if output == 'arrow':
+        writer = pa.ipc.new_file(sink, schema)
+
+        def write(batch):
+            writer.write_batch(batch)
+    else:
+        writer = pq.ParquetWriter(sink, schema)
+
+        def write(batch):
+            writer.write_table(pa.Table.from_batches([batch], schema=schema))
+
+    count = 0
+    batch = []
+    try:
+        for doc in rows:
+            batch.append(doc)
+            if len(batch) == row_group_size:
+                write(_record_batch(schema, batch, metrics))
+                count += len(batch)
+                batch = []
+        if batch:
+            write(_record_batch(schema, batch, metrics))
+            count += len(batch)
+    finally:
+        writer.close()
+    return count
+
+
+def write_metrics(sink, commit_ids, output='parquet', row_group_size=50000, metrics=None):
+    """Write the metrics of all code entity states of the commits as Parquet or Arrow IPC file to sink.
+
+    Rows are read with a server side cursor and written in row groups of row_group_size,
+    so memory use depends on the row group size and not on the number of states.
+    Returns the number of written rows.
+    """
+    if pa is None:
+        raise ImportError('pyarrow is required for columnar exports')
+
+    if metrics is None:
+        metrics = metric_names(commit_ids)
+
+    qry = CodeEntityState.objects(commit_id__in=commit_ids).only('commit_id', 'file_id', 'long_name', 'ce_type', 'metrics').timeout(False).batch_size(min(row_group_size, 10000)).as_pymongo()
+    return write_rows(sink, qry, metrics, output, row_group_size)
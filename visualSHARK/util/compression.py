@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import zlib
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# preferred encodings first, brotli is only available if the module is installed
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+# file suffixes of precompressed files
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def accepted_encodings(request):
+    """Return the set of content codings the client accepts and the set of codings it refuses explicitly (q=0)."""
+    accepted = set()
+    refused = set()
+    for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    refused.add(coding)
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding)
+    return accepted, refused
+
+
+def is_acceptable(encoding, accepted, refused):
+    """* only matches codings which are not refused explicitly."""
+    if encoding in accepted:
+        return True
+    return '*' in accepted and encoding not in refused
+
+
+def choose_encoding(request, available=ENCODINGS):
+    """Choose the best encoding we support which is also accepted by the client, None if there is none."""
+    accepted, refused = accepted_encodings(request)
+    for encoding in available:
+        if is_acceptable(encoding, accepted, refused):
+            return encoding
+    return None
+
+
+def _compressor(encoding):
+    if encoding == 'br':
+        c = brotli.Compressor(quality=settings.COMPRESSION['brotli_quality'])
+        return c.process, c.finish
+    # wbits 16 + MAX_WBITS produces a gzip container instead of a raw zlib stream
+    c = zlib.compressobj(settings.COMPRESSION['gzip_level'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return c.compress, c.flush
+
+
+def compress(data, encoding):
+    """Compress bytes in one go."""
+    process, finish = _compressor(encoding)
+    return process(data) + finish()
+
+
+def compress_sequence(sequence, encoding):
+    """Compress an iterable of bytes lazily, used for streaming responses."""
+    process, finish = _compressor(encoding)
+    for chunk in sequence:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def precompress(path, chunk_size=1024 * 1024):
+    """Write a compressed sibling for every supported encoding next to the file at path.
+
+    The siblings are picked up by precompressed_response so that static artifacts are compressed only once.
+    """
+    for encoding in ENCODINGS:
+        target = path + SUFFIXES[encoding]
+        tmp = target + '.tmp'
+        process, finish = _compressor(encoding)
+        with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+            for chunk in iter(lambda: src.read(chunk_size), b''):
+                dst.write(process(chunk))
+            dst.write(finish())
+        os.replace(tmp, target)
+
+
+def precompressed_response(request, path, content_type):
+    """Serve the file at path, if the client accepts it we serve a precompressed sibling instead.
+
+    Siblings that are older than the file are ignored.
+    """
+    accepted, refused = accepted_encodings(request)
+    serve = path
+    encoding = None
+    for enc in ENCODINGS:
+        if not is_acceptable(enc, accepted, refused):
+            continue
+        candidate = path + SUFFIXES[enc]
+        if os.path.exists(candidate) and os.path.getmtime(candidate) >= os.path.getmtime(path):
+            serve = candidate
+            encoding = enc
+            break
+
+    response = FileResponse(open(serve, 'rb'), content_type=content_type)
+    response['Content-Length'] = os.path.getsize(serve)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
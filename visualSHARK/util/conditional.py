@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import calendar
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+def make_etag(*parts):
+    """Build a strong ETag from the version parts of an artifact."""
+    return quote_etag(hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest())
+
+
+def if_range_matches(request, etag, timestamp):
+    """True if there is no If-Range header or it matches the current version (strong comparison), only then a range may be sent."""
+    if_range = request.META.get('HTTP_IF_RANGE', None)
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    if if_range.startswith('W/'):
+        return False
+    return timestamp is not None and parse_http_date_safe(if_range) == timestamp
+
+
+def conditional(version):
+    """Add conditional GET support (ETag, Last-Modified, 304) to a view method.
+
+    The artifacts we serve (commit graphs, products, releases, stats) only change if one of the batch jobs runs,
+    so the client can always revalidate instead of downloading them again.
+
+    version is called with the arguments of the view method and returns a tuple of a version string and
+    the datetime of the last modification (which may be None). The version string needs to change
+    with every change of the artifact, the query string is part of the ETag automatically.
+
+    If-Range is evaluated here as well, if the client's copy is outdated the Range header is dropped
+    so the view sends the complete artifact.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(view, request, *args, **kwargs):
+            seed, last_modified = version(view, request, *args, **kwargs)
+            etag = make_etag(seed, request.get_full_path())
+
+            timestamp = None
+            if last_modified:
+                timestamp = calendar.timegm(last_modified.utctimetuple())
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                if 'HTTP_RANGE' in request.META and not if_range_matches(request, etag, timestamp):
+                    del request.META['HTTP_RANGE']
+                response = func(view, request, *args, **kwargs)
+                if response.status_code not in (200, 206):
+                    return response
+
+            # precompressed responses are not byte-identical to the artifact
+            if response.has_header('Content-Encoding'):
+                etag = 'W/' + etag
+
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+            patch_cache_control(response, private=True, max_age=settings.CONDITIONAL_MAX_AGE, must_revalidate=True)
+            return response
+        return wrapper
+    return decorator
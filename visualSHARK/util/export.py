@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import io
+from datetime import datetime
+
+from bson import ObjectId
+
+from visualSHARK.models import Commit, FileAction, CodeEntityState
+from visualSHARK.util.renderers import dumps
+
+
+# exportable collections, documents without vcs_system_id are selected via the commits of the vcs system
+EXPORTS = {
+    'commit': {
+        'document': Commit,
+        'by_commit': False,
+        'fields': ('id', 'vcs_system_id', 'revision_hash', 'parents', 'branches', 'author_id', 'author_date', 'author_date_offset', 'committer_id', 'committer_date', 'committer_date_offset', 'message', 'linked_issue_ids', 'labels'),
+    },
+    'fileaction': {
+        'document': FileAction,
+        'by_commit': True,
+        'fields': ('id', 'commit_id', 'file_id', 'old_file_id', 'mode', 'size_at_commit', 'lines_added', 'lines_deleted', 'is_binary'),
+    },
+    'codeentitystate': {
+        'document': CodeEntityState,
+        'by_commit': True,
+        'fields': ('id', 'commit_id', 'file_id', 'long_name', 'ce_type', 'ce_parent_id', 'start_line', 'end_line', 'imports', 'metrics'),
+    },
+}
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_documents(collection, vcs_system_id, batch_size):
+    """Yield raw documents of the collection which belong to the vcs system.
+
+    We work on server side cursors with the given batch size, so memory use only depends on the batch size.
+    """
+    spec = EXPORTS[collection]
+    fields = spec['fields']
+
+    if not spec['by_commit']:
+        yield from spec['document'].objects(vcs_system_id=vcs_system_id).only(*fields).timeout(False).batch_size(batch_size).as_pymongo()
+        return
+
+    commit_ids = []
+    for c in Commit.objects(vcs_system_id=vcs_system_id).only('id').timeout(False).batch_size(batch_size).as_pymongo():
+        commit_ids.append(c['_id'])
+        if len(commit_ids) == batch_size:
+            yield from spec['document'].objects(commit_id__in=commit_ids).only(*fields).batch_size(batch_size).as_pymongo()
+            commit_ids = []
+    if commit_ids:
+        yield from spec['document'].objects(commit_id__in=commit_ids).only(*fields).batch_size(batch_size).as_pymongo()
+
+
+def _rename_id(doc):
+    doc['id'] = doc.pop('_id')
+    return doc
+
+
+def ndjson_lines(documents, batch_size):
+    """Render one JSON document per line, lines are grouped to chunks of batch_size documents."""
+    lines = []
+    for doc in documents:
+        lines.append(dumps(_rename_id(doc)))
+        if len(lines) == batch_size:
+            yield b'\n'.join(lines) + b'\n'
+            lines = []
+    if lines:
+        yield b'\n'.join(lines) + b'\n'
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return dumps(value).decode('utf-8')
+    return value
+
+
+def csv_lines(documents, fields, batch_size):
+    """Render documents as CSV with a header row, nested values are rendered as JSON."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(fields)
+
+    rows = 0
+    for doc in documents:
+        doc = _rename_id(doc)
+        writer.writerow([_csv_value(doc.get(f, None)) for f in fields])
+        rows += 1
+        if rows == batch_size:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+            rows = 0
+    yield buf.getvalue().encode('utf-8')
+
+
+def export(collection, vcs_system_id, output, batch_size):
+    """Return an iterator over the bytes of the complete export."""
+    documents = iter_documents(collection, vcs_system_id, batch_size)
+    if output == 'csv':
+        return csv_lines(documents, EXPORTS[collection]['fields'], batch_size)
+    return ndjson_lines(documents, batch_size)
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import glob
+import json
+import os
+import shutil
+import tempfile
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from django.conf import settings
+
+from visualSHARK.models import MynbouData
+from visualSHARK.util.prediction import DROP_METRICS
+from visualSHARK.util.products import iter_rows
+
+
+# every product row contains these besides the metrics
+META_COLUMNS = ('long_name', 'bugs', 'label')
+
+_DROP = set(DROP_METRICS)
+
+
+class ProductMatrix(object):
+    """Typed feature matrix of a mynbouSHARK product.
+
+    data contains one row per file / class and one column per metric (without the DROP_METRICS),
+    missing values are NaN. long_name, bugs and label are kept in separate arrays.
+    """
+
+    def __init__(self, columns, data, long_name, bugs, label):
+        self.columns = columns
+        self.data = data
+        self.long_name = long_name
+        self.bugs = bugs
+        self.label = label
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def to_frame(self):
+        df = pd.DataFrame(self.data, columns=self.columns)
+        df.insert(0, 'long_name', self.long_name)
+        df.insert(1, 'bugs', self.bugs)
+        df.insert(2, 'label', self.label)
+        return df
+
+    def row(self, i):
+        """Row i as dict like in the product file, missing values are None."""
+        bugs = self.bugs[i]
+        ret = {'long_name': str(self.long_name[i]), 'bugs': None if np.isnan(bugs) else int(bugs), 'label': bool(self.label[i])}
+        for name, v in zip(self.columns, self.data[i].tolist()):
+            ret[name] = None if np.isnan(v) else v
+        return ret
+
+    def select(self, long_name=None, label=None, bugs_gt=None, ordering=None):
+        """Return the indices of the rows matching the filters, ordered by a metric column or long_name / bugs.
+
+        long_name is a prefix, ordering may be prefixed with - for descending order.
+        Raises ValueError for unknown ordering columns.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if long_name:
+            mask &= np.char.startswith(self.long_name, long_name)
+        if label is not None:
+            mask &= self.label == label
+        if bugs_gt is not None:
+            mask &= self.bugs > bugs_gt
+        idx = np.flatnonzero(mask)
+
+        if ordering:
+            key = ordering.lstrip('-')
+            if key in ('long_name', 'bugs'):
+                values = getattr(self, key)[idx]
+            elif key in self.columns:
+                values = self.data[idx, self.columns.index(key)]
+            else:
+                raise ValueError('unknown column {}'.format(key))
+            idx = idx[np.argsort(values, kind='mergesort')]
+            if ordering.startswith('-'):
+                idx = idx[::-1]
+        return idx
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build the matrix from an iterable of product rows (dicts), the rows are consumed one by one."""
+        # one compact float array per metric in the order of their first appearance, padded with NaN
+        metrics = {}
+        long_name = []
+        bugs = array('d')
+        label = []
+        for n, row in enumerate(rows):
+            for k in row.keys():
+                if k not in metrics and k not in META_COLUMNS and k not in _DROP:
+                    metrics[k] = array('d', [np.nan]) * n
+            for k, values in metrics.items():
+                v = row.get(k, None)
+                values.append(np.nan if v is None else v)
+
+            long_name.append(row.get('long_name', ''))
+            b = row.get('bugs', None)
+            bugs.append(np.nan if b is None else b)
+            label.append(bool(row.get('label', False)))
+
+        columns = list(metrics.keys())
+        data = np.empty((len(long_name), len(columns)))
+        for j, values in enumerate(metrics.values()):
+            data[:, j] = np.frombuffer(values, dtype=float)
+
+        bugs = np.frombuffer(bugs, dtype=float).copy()
+        if not np.isnan(bugs).any():
+            bugs = bugs.astype(np.int64)
+
+        return cls(columns, data, np.array(long_name, dtype=str), bugs, np.array(label, dtype=bool))
+
+    def save(self, folder):
+        np.save(os.path.join(folder, 'data.npy'), self.data)
+        np.save(os.path.join(folder, 'long_name.npy'), self.long_name)
+        np.save(os.path.join(folder, 'bugs.npy'), self.bugs)
+        np.save(os.path.join(folder, 'label.npy'), self.label)
+        with open(os.path.join(folder, 'columns.json'), 'w') as f:
+            json.dump(self.columns, f)
+
+    @classmethod
+    def load(cls, folder, mmap_mode=None):
+        with open(os.path.join(folder, 'columns.json'), 'r') as f:
+            columns = json.load(f)
+        arrays = [np.load(os.path.join(folder, '{}.npy'.format(name)), mmap_mode=mmap_mode) for name in ('data', 'long_name', 'bugs', 'label')]
+        return cls(columns, *arrays)
+
+
+def cache_folder(product):
+    """The cache is keyed by id and last_updated of the MynbouData, a new version of the product gets a new folder."""
+    version = product.last_updated.strftime('%Y%m%d%H%M%S%f') if product.last_updated else 'none'
+    return os.path.join(settings.FEATURE_CACHE, '{}_{}'.format(product.id, version))
+
+
+def load(product, mmap_mode=None):
+    """Return the ProductMatrix of the MynbouData document, the product file is only parsed once per version.
+
+    If the product is not cached yet, the complete matrix of the product is built in memory before it is saved,
+    only loads from the cache can be memory mapped.
+    """
+    folder = cache_folder(product)
+    if not os.path.exists(folder):
+        os.makedirs(settings.FEATURE_CACHE, exist_ok=True)
+        matrix = ProductMatrix.from_rows(iter_rows(product))
+
+        # write to a temporary folder first so concurrent requests never see partial files
+        tmp = tempfile.mkdtemp(dir=settings.FEATURE_CACHE)
+        matrix.save(tmp)
+        try:
+            os.rename(tmp, folder)
+        except OSError:
+            # someone else was faster
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        # remove outdated versions of this product
+        for old in glob.glob(os.path.join(settings.FEATURE_CACHE, '{}_*'.format(product.id))):
+            if old != folder:
+                shutil.rmtree(old, ignore_errors=True)
+
+    return ProductMatrix.load(folder, mmap_mode=mmap_mode)
+
+
+def load_products(product_ids, mmap_mode=None):
+    """Load the matrices for a list of MynbouData ids."""
+    return [load(MynbouData.objects.get(id=product_id), mmap_mode=mmap_mode) for product_id in product_ids]
@@ -4,6 +4,7 @@
 import re
 import math
 import networkx as nx
+import numpy as np
 import logging
 import timeit
 from collections import deque
@@ -11,129 +12,209 @@ from collections import deque
 from visualSHARK.models import Commit
 
 
-def tag_filter(tags, discard_qualifiers=True, discard_patch=False):
-    versions = []
+# qualifiers are expected at the end of the tag and they may have a number attached
+# it is very important for the b to be at the end otherwise beta would already be matched!
+QUALIFIERS = ['rc', 'alpha', 'beta', 'b']
+
+# separators are expected to divide 2 or more numbers
+SEPARATORS = ['.', '_', '-']
+
+
+# digit runs and separators, everything else in a version is ignored
+VERSION_TOKEN_RE = re.compile(r'[0-9]+|[._-]')
 
-    # qualifiers are expected at the end of the tag and they may have a number attached
-    # it is very important for the b to be at the end otherwise beta would already be matched!
-    qualifiers = ['rc', 'alpha', 'beta', 'b']
-
-    # separators are expected to divide 2 or more numbers
-    separators = ['.', '_', '-']
-
-    for t in tags:
-
-        tag = t.name
-        c = Commit.objects.get(id=t.commit_id)
-
-        qualifier = ''
-        remove_qualifier = ''
-        for q in qualifiers:
-            if q in tag.lower():
-                tmp = tag.lower().split(q)
-                if tmp[-1].isnumeric():
-                    qualifier = [q, tmp[-1]]
-                    remove_qualifier = ''.join(qualifier)
-                    break
-                else:
-                    qualifier = [q]
-                    remove_qualifier = q
-                    break
-
-        # if we have a qualifier we remove it before we check for best number seperator
-        tmp = tag.lower()
-        if qualifier:
-            tmp = tmp.split(remove_qualifier)[0]
-
-        # we only want numbers and separators
-        version = re.sub('[a-z]', '', tmp)
-
-        # the best separator is the one separating the most numbers
-        best = -1
-        best_sep = None
-        for sep in separators:
-            current = 0
-            for v in version.split(sep):
-                v = ''.join(c for c in v if c.isdigit())
-                if v.isnumeric():
-                    current += 1
-
-            if current > best:
-                best = current
-                best_sep = sep
-
-        version = version.split(best_sep)
-        final_version = []
-        for v in version:
+
+def parse_version(tag):
+    """Return the version numbers (padded to at least 3) and the qualifier (list of qualifier and optional number) of a tag name.
+
+    The version is tokenized once into digit runs and separators and the numbers for every separator are collected in the same pass.
+    Gives the same result as parse_version_legacy which is still used for non ASCII tags
+    where str.isdigit and str.isnumeric also match other digits.
+    """
+    try:
+        tag.encode('ascii')
+    except UnicodeEncodeError:
+        return parse_version_legacy(tag)
+
+    low = tag.lower()
+    qualifier = ''
+    for q in QUALIFIERS:
+        if q in low:
+            number = low.split(q)[-1]
+            if number.isdigit():
+                qualifier = [q, number]
+                low = low[:low.find(q + number)]
+            else:
+                qualifier = [q]
+                low = low[:low.find(q)]
+            break
+
+    # digits of the current part and numbers found so far per separator, letters and other characters are dropped
+    current = {sep: '' for sep in SEPARATORS}
+    numbers = {sep: [] for sep in SEPARATORS}
+    for token in VERSION_TOKEN_RE.findall(low):
+        if token in current:
+            if current[token]:
+                numbers[token].append(current[token])
+                current[token] = ''
+        else:
+            for sep in SEPARATORS:
+                current[sep] += token
+    for sep in SEPARATORS:
+        if current[sep]:
+            numbers[sep].append(current[sep])
+
+    # the best separator is the one separating the most numbers, the first one wins on ties
+    best_sep = max(SEPARATORS, key=lambda sep: len(numbers[sep]))
+    final_version = [int(v) for v in numbers[best_sep]]
+
+    # force semver because we are sorting
+    if final_version:
+        final_version += [0] * (3 - len(final_version))
+
+    return final_version, qualifier
+
+
+def parse_version_legacy(tag):
+    """Return the version numbers (padded to at least 3) and the qualifier (list of qualifier and optional number) of a tag name."""
+    qualifier = ''
+    remove_qualifier = ''
+    for q in QUALIFIERS:
+        if q in tag.lower():
+            tmp = tag.lower().split(q)
+            if tmp[-1].isnumeric():
+                qualifier = [q, tmp[-1]]
+                remove_qualifier = ''.join(qualifier)
+                break
+            else:
+                qualifier = [q]
+                remove_qualifier = q
+                break
+
+    # if we have a qualifier we remove it before we check for best number seperator
+    tmp = tag.lower()
+    if qualifier:
+        tmp = tmp.split(remove_qualifier)[0]
+
+    # we only want numbers and separators
+    version = re.sub('[a-z]', '', tmp)
+
+    # the best separator is the one separating the most numbers
+    best = -1
+    best_sep = None
+    for sep in SEPARATORS:
+        current = 0
+        for v in version.split(sep):
             v = ''.join(c for c in v if c.isdigit())
             if v.isnumeric():
-                final_version.append(int(v))
-
-        # if we have a version we append it to our list
-        if final_version:
-
-            # force semver because we are sorting
-            if len(final_version) == 1:
-                final_version.append(0)
-            if len(final_version) == 2:
-                final_version.append(0)
-
-            fversion = {'version': final_version, 'original': tag, 'revision': c.revision_hash}
-            if qualifier:
-                fversion['qualifier'] = qualifier
-
-            versions.append(fversion)
-
-    # discard fliers
-    p_version = [int(v['version'][0]) for v in versions]
-    sort = sorted(p_version)
-    a = 0.25 * len(sort)
-    b = 0.75 * len(sort)
-    if a.is_integer():
-        a = int(a)  # otherwise could be 6.0
-        x_025 = ((sort[a] + sort[a + 1]) / 2)
-    else:
-        x_025 = sort[math.floor(a) + 1]
-
-    if b.is_integer():
-        b = int(b)
-        x_075 = ((sort[b] + sort[b + 1]) / 2)
-    else:
-        x_075 = sort[math.floor(b) + 1]
+                current += 1
+
+        if current > best:
+            best = current
+            best_sep = sep
+
+    version = version.split(best_sep)
+    final_version = []
+    for v in version:
+        v = ''.join(c for c in v if c.isdigit())
+        if v.isnumeric():
+            final_version.append(int(v))
+
+    # force semver because we are sorting
+    if final_version:
+        if len(final_version) == 1:
+            final_version.append(0)
+        if len(final_version) == 2:
+            final_version.append(0)
+
+    return final_version, qualifier
+
+
+def parse_tags(tags, batch_size=10000):
+    """Parse the version of all tags, the revision hashes of the tagged commits are fetched in batches."""
+    versions = []
+    tags = list(tags.only('name', 'commit_id'))
+    for start in range(0, len(tags), batch_size):
+        batch = tags[start:start + batch_size]
+        revisions = {c['_id']: c['revision_hash'] for c in Commit.objects.filter(id__in=list({t.commit_id for t in batch})).only('revision_hash').as_pymongo()}
+
+        for t in batch:
+            final_version, qualifier = parse_version(t.name)
+
+            # if we have a version we append it to our list
+            if final_version:
+                fversion = {'version': final_version, 'original': t.name, 'revision': revisions.get(t.commit_id, None)}
+                if qualifier:
+                    fversion['qualifier'] = qualifier
+
+                versions.append(fversion)
+    return versions
+
+
+# the quartiles need at least this many versions
+FLIER_MIN_VERSIONS = 5
+
+
+def _quartile(sort, pos):
+    if pos.is_integer():
+        pos = int(pos)  # otherwise could be 6.0
+        return (sort[pos] + sort[pos + 1]) / 2
+    return sort[math.floor(pos) + 1]
+
+
+def discard_fliers(versions):
+    """Remove versions with a major version outside of 1.5 times the interquartile range.
+
+    There are no meaningful quartiles for less than FLIER_MIN_VERSIONS versions, these are returned unchanged.
+    """
+    if len(versions) < FLIER_MIN_VERSIONS:
+        return list(versions)
+
+    majors = [v['version'][0] for v in versions]
+    # comparisons with the float limits need to be exact, int64 would be rounded to float64 above 2 ** 53
+    majors = np.array(majors, dtype=np.int64 if max(majors) < 2 ** 53 else object)
+    sort = np.sort(majors).tolist()
+    x_025 = _quartile(sort, 0.25 * len(sort))
+    x_075 = _quartile(sort, 0.75 * len(sort))
 
     iqr = x_075 - x_025
     flyer_lim = 1.5 * iqr
 
-    ret = []
-    for version in versions:
-        major = int(version['version'][0])
-
-        # no fliers in final list
-        if major > (x_075 + flyer_lim) or major < (x_025 - flyer_lim):
-            print('exclude: {} because {} is not between {} and {}'.format(version['version'], major, (x_025 - flyer_lim), (x_075 + flyer_lim)))
-            continue
+    # no fliers in final list
+    keep = (majors <= (x_075 + flyer_lim)) & (majors >= (x_025 - flyer_lim))
+    for i in np.flatnonzero(~keep):
+        print('exclude: {} because {} is not between {} and {}'.format(versions[i]['version'], majors[i], (x_025 - flyer_lim), (x_075 + flyer_lim)))
+    return [v for v, k in zip(versions, keep) if k]
 
-        if discard_qualifiers and 'qualifier' in version.keys():
-            continue
 
-        ret.append(version)
+def select_versions(versions, discard_qualifiers=True, discard_patch=False):
+    """Sort the versions and discard qualifiers, patch releases and duplicates, the given versions are not modified."""
+    if discard_qualifiers:
+        versions = [v for v in versions if 'qualifier' not in v.keys()]
 
     # sort remaining
-    s = sorted(ret, key=lambda x: (x['version'][0], x['version'][1], x['version'][2]))
+    s = sorted(versions, key=lambda x: (x['version'][0], x['version'][1], x['version'][2]))
 
     ret = []
+    seen = set()
     for v in s:
+        v = dict(v)
         # only minor, we discard patch releases (3rd in semver, everything after 2nd in other schemas)
         if discard_patch:
-            if len(v['version']) > 2:
-                del v['version'][2:]
+            v['version'] = v['version'][:2]
 
-        if v['version'] not in [v2['version'] for v2 in ret]:
+        key = tuple(v['version'])
+        if key not in seen:
+            seen.add(key)
             ret.append(v)
 
     return ret
 
 
+def tag_filter(tags, discard_qualifiers=True, discard_patch=False):
+    return select_versions(discard_fliers(parse_tags(tags)), discard_qualifiers=discard_qualifiers, discard_patch=discard_patch)
+
+
 class OntdekBaan3(object):
     """Discover all paths in a commitgraph represented as an NetworkX DAG.
 
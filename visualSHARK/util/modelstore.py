@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+import sklearn
+
+from django.conf import settings
+
+from visualSHARK.models import MynbouData
+from visualSHARK.util import prediction, features
+
+
+class ModelStore(object):
+    """Local store for fitted classifiers.
+
+    Models are pickled into one file per key, the modification time of the file is used for LRU eviction
+    once the store is bigger than max_size bytes.
+    """
+
+    def __init__(self, folder, max_size):
+        self._folder = folder
+        self._max_size = max_size
+
+    @staticmethod
+    def key(products, prediction_type, params=None, incremental=False):
+        """Fingerprint of the training set (ids and versions of the products), the model type and the hyperparameters.
+
+        The scikit-learn version and the layout of the feature matrices are part of the key, models fitted
+        with another version or on other columns are fitted again.
+        """
+        dat = {'products': sorted([str(p.id), str(p.last_updated)] for p in products),
+               'model': prediction_type,
+               'params': params or {},
+               'incremental': incremental,
+               'sklearn': sklearn.__version__,
+               'features': {'meta': list(features.META_COLUMNS), 'drop': sorted(prediction.DROP_METRICS)}}
+        return hashlib.sha1(json.dumps(dat, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self._folder, '{}.pickle'.format(key))
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                fitted = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            # missing, truncated or pickled by an incompatible version of the classifier's module
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return fitted
+
+    def put(self, key, fitted):
+        os.makedirs(self._folder, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self._folder, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(fitted, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._path(key))
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used models until the store fits into max_size."""
+        entries = []
+        for name in os.listdir(self._folder):
+            if not name.endswith('.pickle'):
+                continue
+            try:
+                st = os.stat(os.path.join(self._folder, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+
+        total = sum(e[1] for e in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self._max_size:
+                break
+            try:
+                os.remove(os.path.join(self._folder, name))
+            except OSError:
+                pass
+            total -= size
+
+
+store = ModelStore(settings.MODEL_STORE['folder'], settings.MODEL_STORE['max_size'])
+
+
+def fitted(product_ids, prediction_type='NB', params=None, chunk_size=None):
+    """Return the fitted classifier for the training products, training is skipped if the store already has it.
+
+    If chunk_size is given the classifier is trained out-of-core on the memory mapped feature matrices.
+    Note that this only bounds the memory of the training, on a cold feature cache features.load still
+    builds the matrix of each product in memory once (one product at a time) before it is written to the cache.
+    """
+    products = [MynbouData.objects.only('id', 'last_updated', 'file').get(id=product_id) for product_id in product_ids]
+    key = ModelStore.key(products, prediction_type, params, incremental=bool(chunk_size))
+
+    model = store.get(key)
+    if model is None:
+        if chunk_size:
+            model = prediction.fit_incremental([features.load(p, mmap_mode='r') for p in products], prediction_type, params, chunk_size)
+        else:
+            model = prediction.fit([features.load(p) for p in products], prediction_type, params)
+        store.put(key, model)
+    return model
@@ -1,14 +1,37 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+from multiprocessing import Pool
+
 import pandas as pd
 import numpy as np
 
+import sklearn
 from sklearn.naive_bayes import GaussianNB
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.model_selection import StratifiedKFold
 from sklearn.metrics import roc_auc_score, precision_score, recall_score
 
 
+CLASSIFIERS = {
+    'NB': GaussianNB,
+    'LR': LogisticRegression,
+    'RF': RandomForestClassifier,
+    'DT': DecisionTreeClassifier,
+}
+
+# the logistic loss of SGDClassifier was renamed in scikit-learn 1.1
+_LOG_LOSS = 'log_loss' if tuple(int(v) for v in sklearn.__version__.split('.')[:2]) >= (1, 1) else 'log'
+
+# classifiers supporting partial_fit for out-of-core training, LR is approximated by SGD with logistic loss
+INCREMENTAL_CLASSIFIERS = {
+    'NB': lambda params: GaussianNB(**params),
+    'LR': lambda params: SGDClassifier(loss=_LOG_LOSS, **params),
+}
+
+
 DROP_METRICS = ['class_Runtime Rules',
  'interface_Runtime Rules',
  'method_HCPL',
@@ -151,10 +174,8 @@ DROP_METRICS += ['enum_AD',
 
 
 def combine(tlist):
-    ret = []
-    for tl in tlist:
-        ret += tl['product']
-    return pd.DataFrame(ret)
+    """Concatenate the feature matrices of the products, metrics missing in a product are NaN."""
+    return pd.concat([tl.to_frame() for tl in tlist], ignore_index=True, sort=False)
 
 
 def drop_metrics(df):
@@ -165,7 +186,8 @@ def drop_metrics(df):
     return df.drop(drop, axis=1)
 
 
-def predict(train, test, prediction_type='NB'):
+def prepare(train, test):
+    """Combine the products of training and test set and drop incomplete columns and rows."""
     train = combine(train)
     test = combine(test)
 
@@ -175,58 +197,221 @@ def predict(train, test, prediction_type='NB'):
 
     train = train.dropna()
     test = test.dropna()
+    return train, test
+
+
+def split(df):
+    """Split into the metric matrix and the labels."""
+    return df.drop(['long_name', 'bugs', 'label'], axis=1).values, df['label'].values
+
+
+def classifier(prediction_type='NB', params=None):
+    """Create an unfitted classifier, params are passed as hyperparameters."""
+    return CLASSIFIERS[prediction_type](**(params or {}))
+
+
+def validate(configurations, scheme='cross_version', folds=10):
+    """Check configurations and folds before any data is loaded, raises ValueError with a message for the client."""
+    if not isinstance(configurations, list):
+        raise ValueError('configurations need to be a list')
+    for conf in configurations:
+        if not isinstance(conf, dict):
+            raise ValueError('every configuration needs to be an object with model and params')
+        if conf.get('model', None) not in CLASSIFIERS:
+            raise ValueError('unknown model {}'.format(conf.get('model', None)))
+        params = conf.get('params', None)
+        if params is not None and not isinstance(params, dict):
+            raise ValueError('params of {} need to be an object'.format(conf['model']))
+        try:
+            c = classifier(conf['model'], params)
+            # scikit-learn >= 1.2 checks types and ranges of the hyperparameters without fitting
+            if hasattr(c, '_validate_params'):
+                c._validate_params()
+        except (TypeError, ValueError, AttributeError) as e:
+            raise ValueError('invalid params for {}: {}'.format(conf['model'], e))
+
+    if scheme == 'kfold' and folds < 2:
+        raise ValueError('folds needs to be at least 2')
+
+
+def score(test_labels, pred_labels):
+    auc_score = roc_auc_score(test_labels, pred_labels)
+    prec = precision_score(test_labels, pred_labels)
+    rec = recall_score(test_labels, pred_labels)
+
+    return {'auc': auc_score, 'precision': prec, 'recall': rec}
 
-    train_data = train.drop(['long_name', 'bugs', 'label'], axis=1).values
-    train_labels = train['label'].values
 
-    test_data = test.drop(['long_name', 'bugs', 'label'], axis=1).values
-    test_labels = test['label'].values
+def positive_probabilities(c, data):
+    """Return the probability of the positive (bug) label for every row."""
+    pos = np.flatnonzero(c.classes_.astype(bool))
+    if len(pos) == 0:
+        return np.zeros(data.shape[0])
+    return c.predict_proba(data)[:, pos[0]]
 
-    if prediction_type == 'NB':
-        c = GaussianNB()
 
-    elif prediction_type == 'LR':
-        c = LogisticRegression()
+def fit(train, prediction_type='NB', params=None):
+    """Fit a classifier on the training products.
 
+    Returns the classifier and the metric columns it was trained on.
+    """
+    train = drop_metrics(combine(train)).dropna()
+    train_data, train_labels = split(train)
+
+    c = classifier(prediction_type, params)
     c.fit(train_data, train_labels)
+
+    columns = [col for col in train.columns if col not in ('long_name', 'bugs', 'label')]
+    return c, columns
+
+
+def union_columns(tlist):
+    """Metric columns of all products in order of their first appearance, the same as combine would produce."""
+    columns = []
+    seen = set()
+    for tl in tlist:
+        for col in tl.columns:
+            if col not in seen and col not in DROP_METRICS:
+                seen.add(col)
+                columns.append(col)
+    return columns
+
+
+def iter_chunks(tlist, columns, chunk_size):
+    """Yield metric matrix and labels of at most chunk_size rows per step, aligned to columns.
+
+    Rows with missing values are dropped like dropna does for the combined products.
+    Only one chunk is materialized at a time, so memory mapped products are never completely loaded.
+    """
+    for tl in tlist:
+        index = {col: i for i, col in enumerate(tl.columns)}
+        take = np.array([index.get(col, 0) for col in columns], dtype=np.intp)
+        missing = np.array([col not in index for col in columns], dtype=bool)
+
+        for start in range(0, len(tl), chunk_size):
+            data = np.asarray(tl.data[start:start + chunk_size])[:, take]
+            data[:, missing] = np.nan
+            bugs = np.asarray(tl.bugs[start:start + chunk_size], dtype=float)
+            labels = np.asarray(tl.label[start:start + chunk_size])
+
+            keep = ~(np.isnan(data).any(axis=1) | np.isnan(bugs))
+            yield data[keep], labels[keep]
+
+
+def fit_incremental(train, prediction_type='NB', params=None, chunk_size=10000):
+    """Fit a classifier chunk by chunk with partial_fit, peak memory depends on the chunk size instead of the training set size.
+
+    Returns the classifier and the metric columns it was trained on, like fit.
+    """
+    columns = union_columns(train)
+    c = INCREMENTAL_CLASSIFIERS[prediction_type](params or {})
+
+    for data, labels in iter_chunks(train, columns, chunk_size):
+        if len(labels) > 0:
+            c.partial_fit(data, labels, classes=np.array([False, True]))
+    return c, columns
+
+
+def prepare_test(test, columns):
+    """Combine the test products with the same metric columns the classifier was trained on."""
+    test = combine(test)
+    return test.reindex(columns=['long_name', 'bugs', 'label'] + list(columns)).dropna()
+
+
+def apply(fitted, test, probabilities=False):
+    """Predict the test products with a fitted classifier (see fit)."""
+    c, columns = fitted
+    test = prepare_test(test, columns)
+    test_data, test_labels = split(test)
+
     pred_labels = c.predict(test_data)
 
-    results = []
-    for i, l in enumerate(pred_labels):
-        row = test.iloc[i]
-        results.append({'long_name': row['long_name'], 'bugs': row['bugs'], 'label': l})
+    # assemble the result column-wise, row access via iloc is way too slow for large products
+    columns = {'long_name': test['long_name'].values.tolist(),
+               'bugs': test['bugs'].values.tolist(),
+               'label': pred_labels.tolist()}
+    if probabilities:
+        columns['probability'] = positive_probabilities(c, test_data).tolist()
+
+    keys = list(columns.keys())
+    results = [dict(zip(keys, values)) for values in zip(*columns.values())]
 
     return {'product': results}
 
 
+def evaluate(fitted, test):
+    """Evaluate a fitted classifier (see fit) on the test products."""
+    c, columns = fitted
+    test = prepare_test(test, columns)
+    test_data, test_labels = split(test)
+
+    return score(test_labels, c.predict(test_data))
+
+
+def predict(train, test, prediction_type='NB', probabilities=False):
+    return apply(fit(train, prediction_type), test, probabilities)
+
+
 def predict_evaluate(train, test, prediction_type='NB'):
-    train = combine(train)
-    test = combine(test)
+    return evaluate(fit(train, prediction_type), test)
 
-    # first drop columns that are NaN everywhere
-    train = drop_metrics(train)
-    test = drop_metrics(test)
 
-    train = train.dropna()
-    test = test.dropna()
+# the splits are sent once to every worker process of the pool instead of once per task
+_splits = None
 
-    train_data = train.drop(['long_name', 'bugs', 'label'], axis=1).values
-    train_labels = train['label'].values
 
-    test_data = test.drop(['long_name', 'bugs', 'label'], axis=1).values
-    test_labels = test['label'].values
+def _init_worker(splits):
+    global _splits
+    _splits = splits
 
-    if prediction_type == 'NB':
-        c = GaussianNB()
 
-    elif prediction_type == 'LR':
-        c = LogisticRegression()
+def _fit_score(task):
+    prediction_type, params, split_index = task
+    train_data, train_labels, test_data, test_labels = _splits[split_index]
 
+    c = classifier(prediction_type, params)
     c.fit(train_data, train_labels)
-    pred_labels = c.predict(test_data)
+    try:
+        return score(test_labels, c.predict(test_data))
+    except ValueError:
+        # e.g., only one class in the test fold
+        return {'auc': float('nan'), 'precision': float('nan'), 'recall': float('nan')}
 
-    auc_score = roc_auc_score(test_labels, pred_labels)
-    prec = precision_score(test_labels, pred_labels)
-    rec = recall_score(test_labels, pred_labels)
 
-    return {'auc': auc_score, 'precision': prec, 'recall': rec}
+def compare(train, test, configurations, scheme='cross_version', folds=10, n_jobs=1):
+    """Fit and score every configuration on every split of the data.
+
+    configurations is a list of dicts with model (key of CLASSIFIERS) and params (hyperparameters).
+    With the cross_version scheme the model is trained on train and tested on test,
+    with the kfold scheme only train is used in a stratified k-fold cross validation.
+
+    The data is combined only once, the configurations are fitted in a pool of n_jobs processes.
+    Returns the scores per configuration and split and the mean scores per configuration.
+    """
+    # fail early on unknown models or hyperparameters
+    validate(configurations, scheme, folds)
+
+    if scheme == 'kfold':
+        data, labels = split(drop_metrics(combine(train)).dropna())
+        skf = StratifiedKFold(n_splits=folds, shuffle=True, random_state=0)
+        splits = [(data[tr], labels[tr], data[te], labels[te]) for tr, te in skf.split(data, labels)]
+    else:
+        train, test = prepare(train, test)
+        splits = [split(train) + split(test)]
+
+    tasks = [(conf['model'], conf.get('params', None), i) for conf in configurations for i in range(len(splits))]
+
+    if n_jobs > 1:
+        with Pool(processes=n_jobs, initializer=_init_worker, initargs=(splits,)) as pool:
+            scores = pool.map(_fit_score, tasks)
+    else:
+        _init_worker(splits)
+        scores = [_fit_score(t) for t in tasks]
+
+    results = []
+    for i, conf in enumerate(configurations):
+        per_split = scores[i * len(splits):(i + 1) * len(splits)]
+        mean = {k: float(np.nanmean([s[k] for s in per_split])) for k in ('auc', 'precision', 'recall')}
+        results.append({'model': conf['model'], 'params': conf.get('params', {}) or {}, 'scores': per_split, 'mean': mean})
+
+    return {'scheme': scheme, 'splits': len(splits), 'results': results}
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+from django.utils import timezone
+
+from visualSHARK.models import ProductMetadata
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+
+# top level fields of a product besides the product rows
+HEADER_FIELDS = ('label_path_approach', 'start_commit', 'end_commit')
+
+
+def _open(product):
+    """Return the GridFS file of a MynbouData document as file like object positioned at the start."""
+    f = product.file.get()
+    f.seek(0)
+    return f
+
+
+def read_header(product, fields=HEADER_FIELDS):
+    """Read top level scalar fields of the product file.
+
+    The product rows are only tokenized, never built. If the fields are in front of the rows we stop reading early.
+    """
+    if ijson is None:
+        dat = json.loads(_open(product).read())
+        return {k: dat.get(k, None) for k in fields}
+
+    ret = {}
+    for prefix, event, value in ijson.parse(_open(product)):
+        if prefix in fields and event in ('string', 'number', 'boolean', 'null'):
+            ret[prefix] = value
+            if len(ret) == len(fields):
+                break
+    return ret
+
+
+def iter_rows(product, fields=None):
+    """Yield the rows of the product one by one, optionally only with the given fields.
+
+    Only one row is decoded at a time instead of the complete file.
+    """
+    if ijson is None:
+        rows = json.loads(_open(product).read())['product']
+    else:
+        rows = ijson.items(_open(product), 'product.item', use_float=True)
+
+    for row in rows:
+        if fields:
+            row = {k: row.get(k, None) for k in fields}
+        yield row
+
+
+def _aware(dt):
+    """MynbouData.last_updated is stored as naive UTC datetime."""
+    if dt is not None and timezone.is_naive(dt):
+        return timezone.make_aware(dt, timezone.utc)
+    return dt
+
+
+def build_metadata(product):
+    """Read the product file once and create or update its ProductMetadata."""
+    header = read_header(product)
+
+    rows = 0
+    columns = {}
+    for row in iter_rows(product):
+        rows += 1
+        for k in row.keys():
+            columns.setdefault(k, None)
+
+    meta, created = ProductMetadata.objects.update_or_create(mynbou_id=str(product.id), defaults={
+        'last_updated': _aware(product.last_updated),
+        'vcs_system_id': str(product.vcs_system_id),
+        'name': product.name,
+        'label_path_approach': header.get('label_path_approach', None),
+        'start_commit': header.get('start_commit', None),
+        'end_commit': header.get('end_commit', None),
+        'rows': rows,
+        'columns': json.dumps(list(columns.keys())),
+        'size': product.file.length or 0,
+    })
+    return meta
+
+
+def metadata(product):
+    """Return the ProductMetadata of the MynbouData document, the product file is only read if the index is missing or outdated."""
+    meta = ProductMetadata.objects.filter(mynbou_id=str(product.id)).first()
+    if meta is None or meta.last_updated != _aware(product.last_updated):
+        meta = build_metadata(product)
+    return meta
@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+from visualSHARK.models import VCSSystem, Tag, ReleaseIndex
+from visualSHARK.util.helper import parse_tags, discard_fliers, select_versions
+
+
+def fingerprint(vcs_system_id):
+    """Changes if tags are added or removed or the VCS system is collected again, returns the fingerprint and the last update."""
+    vcs = VCSSystem.objects.only('id', 'last_updated').get(id=vcs_system_id)
+    tags = Tag.objects.filter(vcs_system_id=vcs.id)
+    newest = tags.only('id').order_by('-id').first()
+    return '{}:{}:{}:{}'.format(vcs.id, vcs.last_updated, tags.count(), newest.id if newest else None), vcs.last_updated
+
+
+def index(vcs_system_id):
+    """Return the parsed versions of the VCS system without fliers, the tags are only parsed again if they changed."""
+    fp, last_updated = fingerprint(vcs_system_id)
+    idx = ReleaseIndex.objects.filter(vcs_system_id=str(vcs_system_id)).first()
+    if idx is not None and idx.fingerprint == fp:
+        return json.loads(idx.versions)
+
+    versions = discard_fliers(parse_tags(Tag.objects.filter(vcs_system_id=vcs_system_id)))
+    ReleaseIndex.objects.update_or_create(vcs_system_id=str(vcs_system_id), defaults={'fingerprint': fp, 'versions': json.dumps(versions)})
+    return versions
+
+
+def releases(vcs_system_id, discard_qualifiers=True, discard_patch=False):
+    """Same as tag_filter for all tags of the VCS system, but answered from the release index."""
+    return select_versions(index(vcs_system_id), discard_qualifiers=discard_qualifiers, discard_patch=discard_patch)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+
+from bson import ObjectId
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class MongoJSONEncoder(JSONEncoder):
+    """JSONEncoder of the rest framework which additionally knows about ObjectIds."""
+
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        return super().default(obj)
+
+
+_encoder = MongoJSONEncoder()
+
+if orjson is not None:
+    # datetimes, UUIDs and numpy types are handled natively by orjson, NaN is rendered as null
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_UTC_Z
+
+
+def dumps(data):
+    """Serialize data to UTF-8 encoded JSON bytes, uses orjson if it is available."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_encoder.default, option=ORJSON_OPTIONS)
+    return json.dumps(data, cls=MongoJSONEncoder, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in replacement for the JSONRenderer of the rest framework.
+
+    The stdlib json module is too slow for the large responses of the commit graph and the products,
+    so we render with orjson if it is installed. Indented output (e.g., for the browsable API)
+    and installations without orjson fall back to the default renderer.
+    """
+
+    encoder_class = MongoJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return bytes()
+
+        renderer_context = renderer_context or {}
+        if orjson is None or self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return dumps(data)
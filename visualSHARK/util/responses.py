@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+
+from visualSHARK.util.compression import compress_sequence
+from visualSHARK.util.renderers import dumps
+
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _splice(head, fileobj, tail, chunk_size):
+    yield head
+    try:
+        for chunk in iter(lambda: fileobj.read(chunk_size), b''):
+            yield chunk
+    finally:
+        fileobj.close()
+    yield tail
+
+
+def spliced_json_response(envelope, key, fileobj, size, chunk_size=None):
+    """Stream a JSON object consisting of envelope plus the already serialized JSON in fileobj as value of key.
+
+    The file is never decoded, it is copied chunk by chunk into the response so memory use
+    does not depend on the size of the file.
+    """
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+
+    # the envelope is small, we render it and cut off the closing bracket
+    head = dumps(envelope)[:-1]
+    if len(head) > 1:
+        head += b','
+    head += dumps(key) + b':'
+    tail = b'}'
+
+    response = StreamingHttpResponse(_splice(head, fileobj, tail, chunk_size), content_type='application/json')
+    response['Content-Length'] = len(head) + size + len(tail)
+    return response
+
+
+def _chunks(fileobj, start, length, chunk_size):
+    fileobj.seek(start)
+    try:
+        while length > 0:
+            chunk = fileobj.read(min(chunk_size, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fileobj.close()
+
+
+def parse_range(header, size):
+    """Return (start, end) of a single byte range header, end is inclusive.
+
+    None is returned for missing, malformed (last byte before first byte) or multipart ranges,
+    in that case the complete file is sent. Raises ValueError if the range can not be satisfied.
+    """
+    m = RANGE_RE.match(header.strip()) if header else None
+    if not m or not any(m.groups()):
+        return None
+
+    start, end = m.groups()
+    if not start:
+        # suffix range, the last n bytes
+        n = int(end)
+        if n == 0 or size == 0:
+            raise ValueError('unsatisfiable range')
+        return max(0, size - n), size - 1
+
+    start = int(start)
+    if end and int(end) < start:
+        return None
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        raise ValueError('unsatisfiable range')
+    return start, end
+
+
+def file_response(request, fileobj, size, content_type, filename, gzip=False, chunk_size=None):
+    """Stream a seekable file (e.g., GridFS) as download in chunks of chunk_size.
+
+    Single byte ranges are supported with 206 / 416 responses, If-Range is handled by the conditional decorator
+    of the view which drops the Range header for outdated copies. With gzip the file is compressed on the fly,
+    the size is unknown then, so neither Content-Length nor ranges are available.
+    """
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+
+    if gzip:
+        response = StreamingHttpResponse(compress_sequence(_chunks(fileobj, 0, size, chunk_size), 'gzip'), content_type='application/gzip')
+        response['Content-Disposition'] = 'attachment; filename="{}.gz"'.format(filename)
+        return response
+
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE', None), size)
+    except ValueError:
+        fileobj.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(size)
+        return response
+
+    if byte_range is None:
+        response = StreamingHttpResponse(_chunks(fileobj, 0, size, chunk_size), content_type=content_type)
+        response['Content-Length'] = str(size)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_chunks(fileobj, start, end - start + 1, chunk_size), status=206, content_type=content_type)
+        response['Content-Length'] = str(end - start + 1)
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import string
+from functools import lru_cache
+from multiprocessing import Pool
+
+from nltk.corpus import stopwords
+from nltk.stem.wordnet import WordNetLemmatizer
+
+
+def issue_text(issue, comments=()):
+    """Text of an issue as used for topic inference, title, description and the comments."""
+    s = str(issue.title) + " " + str(issue.desc)
+    for comment in comments:
+        s += str(comment)
+    return s
+
+
+URL_RE = re.compile(r'^https?:\/\/.*[\r\n]*', flags=re.MULTILINE)
+
+# everything but these characters is dropped, lowercase z is missing in the original whitelist the models are trained with
+NOT_WHITELISTED_RE = re.compile(r"[^abcdefghijklmnopqrstuvwxyABCDEFGHIJKLMNOPQRSTUVWXYZ ?.!']")
+
+PUNCTUATION = str.maketrans('', '', string.punctuation)
+
+
+@lru_cache(maxsize=None)
+def _stopwords():
+    return frozenset(stopwords.words('english'))
+
+
+@lru_cache(maxsize=None)
+def _lemmatizer():
+    return WordNetLemmatizer()
+
+
+@lru_cache(maxsize=1024 * 128)
+def _token(word):
+    """Lemmatized word without punctuation, the lemmatizer is by far the most expensive part so results are memoized."""
+    return _lemmatizer().lemmatize(word).translate(PUNCTUATION)
+
+
+def preprocess(s):
+    """Clean the text and return the tokens the topic models are trained on.
+
+    Gives the same tokens as preprocess_legacy, but the text is only tokenized once and
+    stopwords, lemmatizer and lemmas are reused between calls.
+    """
+    s = URL_RE.sub('', s)
+    s = s.replace('\r\n', ' ').replace('\n', ' ')
+    s = NOT_WHITELISTED_RE.sub('', s)
+
+    stopword = _stopwords()
+    tokens = []
+    for word in s.lower().split():
+        if word in stopword:
+            continue
+        # words with size 2 or less makes no sense
+        tokens.extend(t for t in _token(word).split() if len(t) > 2)
+    return tokens
+
+
+def preprocess_legacy(s):
+    """Original preprocessing of the TopicModelView, only kept as reference for benchmark_preprocess."""
+    whitelist = set("abcdefghijklmnopqrstuvwxy ABCDEFGHIJKLMNOPQRSTUVWXYZ?.!'")
+    stopword = set(stopwords.words('english'))
+    punctuation = set(string.punctuation)
+    lemmatize = WordNetLemmatizer()
+
+    # Remove URLS
+    s = re.sub(r'^https?:\/\/.*[\r\n]*', '', s, flags=re.MULTILINE)
+    s = s.replace('\r\n', ' ')
+    s = s.replace('\n', ' ')
+    # Only words..
+    s = ''.join(filter(whitelist.__contains__, s))
+    # Rest
+    s = " ".join([i for i in s.lower().split() if i not in stopword])
+    s = " ".join(lemmatize.lemmatize(i) for i in s.split())
+    s = "".join(i for i in s if i not in punctuation)
+    # Words with size 2 or less makes no sense
+    s = " ".join([w for w in s.split() if len(w) > 2])
+    return s.split()
+
+
+# smaller batches are preprocessed in process, the memoized lemmas make this faster than sending them to the pool
+POOL_MIN_TEXTS = 200
+
+def preprocess_all(texts, n_jobs=1):
+    """Preprocess a list of texts, large lists with n_jobs > 1 in a process pool."""
+    if n_jobs <= 1 or len(texts) < POOL_MIN_TEXTS:
+        return [preprocess(s) for s in texts]
+
+    # the pool only lives for this batch, long lived workers forked from a threaded web worker would
+    # keep copies of its file descriptors (e.g., the locks on materialized topic models) open
+    with Pool(min(n_jobs, len(texts))) as pool:
+        return pool.map(preprocess, texts, chunksize=max(1, len(texts) // (n_jobs * 4)))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import tempfile
+from contextlib import ExitStack
+from itertools import combinations
+from multiprocessing import Pool
+
+import gensim
+import numpy as np
+
+from django.conf import settings
+
+from visualSHARK.models import TopicModel
+from visualSHARK.util import topicmodel
+
+
+DISTANCES = ('jensen_shannon', 'kullback_leibler', 'hellinger', 'jaccard')
+
+
+def _key(a, b, distance):
+    return hashlib.sha1('{}|{}|{}'.format(topicmodel.version(a), topicmodel.version(b), distance).encode('utf-8')).hexdigest()
+
+
+def path(a, b, distance):
+    """Diff matrices are keyed by the versions of both models, a replaced model gets new matrices."""
+    return os.path.join(settings.TOPIC_DIFFS, '{}.npy'.format(_key(a, b, distance)))
+
+
+def _ordered(a, b):
+    return (a, b, False) if str(a.id) < str(b.id) else (b, a, True)
+
+
+def read(a, b, distance='jensen_shannon'):
+    """Return the topic diff matrix (topics of a x topics of b) or None if it was not computed yet."""
+    first, second, transposed = _ordered(a, b)
+    try:
+        mdiff = np.load(path(first, second, distance), mmap_mode='r')
+    except OSError:
+        return None
+    return mdiff.T if transposed else mdiff
+
+
+def _save(mdiff, target):
+    os.makedirs(settings.TOPIC_DIFFS, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=settings.TOPIC_DIFFS, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        np.save(f, mdiff)
+    os.replace(tmp, target)
+
+
+def _diff(task):
+    """Runs in the pool, the models are loaded memory mapped from the local topic model store."""
+    first, second, distance = task
+    lda_a = gensim.models.LdaModel.load(os.path.join(first, topicmodel.FILES['lda']), mmap='r')
+    lda_b = gensim.models.LdaModel.load(os.path.join(second, topicmodel.FILES['lda']), mmap='r')
+    mdiff, annotation = lda_a.diff(lda_b, distance=distance, annotation=False)
+    return mdiff
+
+
+def compare_project(project_id, distance='jensen_shannon', n_jobs=1):
+    """Compute the missing pairwise topic diff matrices of all TopicModels of the project.
+
+    The model files are materialized first and stay locked until the pool workers, which only read them from disk, are finished.
+    Returns the number of model pairs and the number of computed matrices.
+    """
+    models = list(TopicModel.objects.filter(project_id=project_id))
+    pairs = [_ordered(a, b)[:2] for a, b in combinations(models, 2)]
+    missing = [(a, b) for a, b in pairs if not os.path.exists(path(a, b, distance))]
+
+    with ExitStack() as stack:
+        folders = {}
+        for a, b in missing:
+            for m in (a, b):
+                if m.id not in folders:
+                    folders[m.id] = stack.enter_context(topicmodel.materialized(m))
+
+        tasks = [(folders[a.id], folders[b.id], distance) for a, b in missing]
+        if n_jobs > 1 and len(tasks) > 1:
+            with Pool(processes=min(n_jobs, len(tasks))) as pool:
+                results = pool.map(_diff, tasks)
+        else:
+            results = [_diff(t) for t in tasks]
+
+    for (a, b), mdiff in zip(missing, results):
+        _save(mdiff, path(a, b, distance))
+
+    return {'pairs': len(pairs), 'computed': len(missing)}
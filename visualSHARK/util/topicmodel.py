@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import fcntl
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import gensim
+import numpy as np
+from mongoengine import signals
+
+from django.conf import settings
+
+from visualSHARK.models import TopicModel
+
+
+# TopicModel FileField -> name of the local file gensim expects
+FILES = {
+    'dic': 'dic.dict',
+    'lda': 'topic.model',
+    'lda_id2word': 'topic.model.id2word',
+    'lda_state': 'topic.model.state',
+    'lda_expElogbeta': 'topic.model.expElogbeta.npy',
+}
+
+# rough size of one dictionary entry (token2id, id2token, dfs)
+DICTIONARY_ENTRY_SIZE = 200
+
+# bumped if the layout of the local files changes, e.g., which arrays are stored separately
+LAYOUT = 'mmap-1'
+
+
+def version(model):
+    """The files of a TopicModel are replaced as a whole, the GridFS ids identify the current version."""
+    return '{}:{}'.format(model.lda.grid_id, model.dic.grid_id)
+
+
+def _folder(model_id):
+    return os.path.join(settings.TOPIC_MODELS['folder'], str(model_id))
+
+
+def _is_current(folder, stamp):
+    try:
+        with open(os.path.join(folder, 'VERSION'), 'r') as f:
+            return f.read() == stamp
+    except OSError:
+        return False
+
+
+def _lock_path(model_id):
+    os.makedirs(settings.TOPIC_MODELS['folder'], exist_ok=True)
+    return os.path.join(settings.TOPIC_MODELS['folder'], '.{}.lock'.format(model_id))
+
+
+@contextmanager
+def _locked(model_id, blocking=True):
+    """Exclusive lock per TopicModel across all processes on this host.
+
+    Raises BlockingIOError if blocking is False and the lock is held by someone else.
+    """
+    with open(_lock_path(model_id), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _download(model, folder, stamp):
+    """Write the GridFS files into folder and check them against the sizes stored in GridFS."""
+    for field, name in FILES.items():
+        path = os.path.join(folder, name)
+        src = getattr(model, field).get()
+        with open(path, 'wb') as f:
+            shutil.copyfileobj(src, f, settings.STREAM_CHUNK_SIZE)
+        if os.path.getsize(path) != src.length:
+            raise IOError('incomplete download of {} for TopicModel {}'.format(field, model.id))
+
+    # LdaModel.save stores expElogbeta separately but the state only above gensims size limit
+    path = os.path.join(folder, FILES['lda'])
+    lda = gensim.models.LdaModel.load(path)
+    lda.save(path)
+    lda.state.save(os.path.join(folder, FILES['lda_state']), separately=['sstats'])
+
+    # written last, a folder without VERSION is never used
+    with open(os.path.join(folder, 'VERSION'), 'w') as f:
+        f.write(stamp)
+
+
+def _replace(model, folder, stamp):
+    """Download into a temporary folder which replaces the model folder once it is complete, the caller holds the exclusive lock."""
+    tmp = tempfile.mkdtemp(dir=settings.TOPIC_MODELS['folder'], prefix='.{}-'.format(model.id))
+    try:
+        _download(model, tmp, stamp)
+        if os.path.exists(folder):
+            old = tempfile.mkdtemp(dir=settings.TOPIC_MODELS['folder'], prefix='.{}-'.format(model.id))
+            os.rename(folder, os.path.join(old, 'outdated'))
+            shutil.rmtree(old, ignore_errors=True)
+        os.rename(tmp, folder)
+    except Exception:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+@contextmanager
+def materialized(model):
+    """Yield the local folder with the files of the TopicModel, they are downloaded from GridFS if missing or outdated.
+
+    The model is saved again with the large arrays (expElogbeta, sstats) as separate .npy files,
+    so that every worker process can load it with mmap='r' and the arrays are shared via the page cache.
+    While the folder is in use a shared lock is held, so it is neither replaced nor evicted.
+    Only one process downloads a model (exclusive lock), the others wait for it.
+    """
+    folder = _folder(model.id)
+    stamp = '{} {}'.format(LAYOUT, version(model))
+
+    with open(_lock_path(model.id), 'w') as f:
+        try:
+            while True:
+                fcntl.flock(f, fcntl.LOCK_SH)
+                if _is_current(folder, stamp):
+                    break
+
+                # converting the lock is not atomic, someone else may have finished in between
+                fcntl.flock(f, fcntl.LOCK_EX)
+                if not _is_current(folder, stamp):
+                    _replace(model, folder, stamp)
+                    fcntl.flock(f, fcntl.LOCK_SH)
+                    evict()
+
+            # mark as recently used
+            try:
+                os.utime(os.path.join(folder, 'VERSION'))
+            except OSError:
+                pass
+            yield folder
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def evict():
+    """Remove least recently used model folders until the store fits into TOPIC_MODELS['max_size'].
+
+    Folders which are currently written or in use (locked) are skipped, processes which have the files mapped keep working on them.
+    """
+    root = settings.TOPIC_MODELS['folder']
+    entries = []
+    for name in os.listdir(root):
+        folder = os.path.join(root, name)
+        if name.startswith('.') or not os.path.isdir(folder):
+            continue
+        try:
+            size = sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+            mtime = os.path.getmtime(os.path.join(folder, 'VERSION'))
+        except OSError:
+            continue
+        entries.append((mtime, size, name))
+
+    total = sum(e[1] for e in entries)
+    for mtime, size, name in sorted(entries):
+        if total <= settings.TOPIC_MODELS['max_size']:
+            break
+        try:
+            with _locked(name, blocking=False):
+                shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+        except BlockingIOError:
+            continue
+        total -= size
+
+
+def _size(lda, dic):
+    """Estimated private memory use of a loaded model in bytes, memory mapped arrays live in the page cache and are not counted."""
+    size = sum(a.nbytes for a in (lda.expElogbeta, lda.state.sstats) if not isinstance(a, np.memmap))
+    return size + len(dic) * DICTIONARY_ENTRY_SIZE
+
+
+class ModelCache(object):
+    """Per process LRU cache of loaded (lda, dictionary) tuples keyed by TopicModel id.
+
+    Entries are dropped least recently used first once the estimated size exceeds max_size bytes,
+    if the TopicModel is replaced (different version) or explicitly via invalidate.
+    """
+
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._entries = OrderedDict()  # id -> (version, lda, dic, size)
+        self._lock = threading.Lock()
+
+    def get(self, model):
+        key = str(model.id)
+        current = version(model)
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and entry[0] == current:
+                self._entries.move_to_end(key)
+                return entry[1], entry[2]
+
+        with materialized(model) as folder:
+            dic = gensim.corpora.Dictionary.load(os.path.join(folder, FILES['dic']))
+            lda = gensim.models.LdaModel.load(os.path.join(folder, FILES['lda']), mmap='r')
+
+        with self._lock:
+            self._entries[key] = (current, lda, dic, _size(lda, dic))
+            self._evict()
+        return lda, dic
+
+    def invalidate(self, model_id):
+        with self._lock:
+            self._entries.pop(str(model_id), None)
+
+    def _evict(self):
+        total = sum(e[3] for e in self._entries.values())
+        # the most recent entry is kept even if it is larger than the cache on its own
+        while total > self._max_size and len(self._entries) > 1:
+            key, entry = self._entries.popitem(last=False)
+            total -= entry[3]
+
+
+cache = ModelCache(settings.TOPIC_MODELS['cache_size'])
+
+
+def load(model):
+    """Return the loaded lda model and dictionary of the TopicModel document."""
+    return cache.get(model)
+
+
+def infer(lda, corpus):
+    """Topic distributions for a whole bag-of-words corpus with one inference call.
+
+    Returns one list of (topic id, probability) per document, filtered like LdaModel.get_document_topics.
+    """
+    if not corpus:
+        return []
+    gamma, _ = lda.inference(corpus)
+    dist = gamma / gamma.sum(axis=1)[:, np.newaxis]
+    minimum_probability = max(lda.minimum_probability, 1e-8)
+    return [[(int(t), float(p)) for t, p in enumerate(row) if p >= minimum_probability] for row in dist]
+
+
+def _invalidate(sender, document, **kwargs):
+    cache.invalidate(document.id)
+
+
+signals.post_save.connect(_invalidate, sender=TopicModel)
+signals.post_delete.connect(_invalidate, sender=TopicModel)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import tempfile
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from django.conf import settings
+
+from visualSHARK.models import Issue, IssueComment, IssueSystem, Message, MailingList
+from visualSHARK.util import text, topicmodel
+
+
+# documents for which topics can be precomputed
+KINDS = ('issue', 'message')
+
+_lock = threading.Lock()
+_loaded = {}  # path -> (mtime, Topics)
+
+
+class Topics(object):
+    """Sparse topic distributions of all documents of one kind for one TopicModel.
+
+    ids are the sorted ObjectIds (as strings) of the documents, row i of matrix belongs to ids[i].
+    """
+
+    def __init__(self, version, ids, matrix):
+        self.version = version
+        self.ids = ids
+        self.matrix = matrix
+        self._dense = None
+
+    def dense(self):
+        """Dense float32 matrix with rows normalized to sum 1 (missing small probabilities are left out by the store)."""
+        if self._dense is None:
+            dense = self.matrix.toarray().astype(np.float32)
+            sums = dense.sum(axis=1, keepdims=True)
+            self._dense = np.divide(dense, sums, out=np.zeros_like(dense), where=sums > 0)
+        return self._dense
+
+    def index(self, doc_id):
+        i = np.searchsorted(self.ids, str(doc_id))
+        if i >= len(self.ids) or self.ids[i] != str(doc_id):
+            return None
+        return i
+
+    @property
+    def last_id(self):
+        return self.ids[-1] if len(self.ids) else None
+
+    def get(self, doc_id):
+        """Return the list of (topic, probability) of the document or None if it is not in the store."""
+        i = self.index(doc_id)
+        if i is None:
+            return None
+        row = self.matrix.getrow(i)
+        return [(int(t), float(p)) for t, p in zip(row.indices, row.data)]
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, version=self.version, ids=self.ids, data=self.matrix.data, indices=self.matrix.indices,
+                     indptr=self.matrix.indptr, shape=self.matrix.shape)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            matrix = sp.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            return cls(str(f['version']), f['ids'], matrix)
+
+
+def path(model, kind):
+    return os.path.join(settings.TOPIC_STORE, '{}_{}.npz'.format(model.id, kind))
+
+
+def load(model, kind):
+    """Return the stored Topics of the TopicModel, None if there are none or they belong to an older version of the model."""
+    p = path(model, kind)
+    try:
+        mtime = os.path.getmtime(p)
+    except OSError:
+        return None
+
+    with _lock:
+        entry = _loaded.get(p, None)
+    if entry is None or entry[0] != mtime:
+        entry = (mtime, Topics.load(p))
+        with _lock:
+            _loaded[p] = entry
+
+    topics = entry[1]
+    if topics.version != topicmodel.version(model):
+        return None
+    return topics
+
+
+def lookup(model, kind, doc_id):
+    topics = load(model, kind)
+    if topics is None:
+        return None
+    return topics.get(doc_id)
+
+
+def _cosine(block, q):
+    norms = np.linalg.norm(block, axis=1) * np.linalg.norm(q)
+    return np.divide(block @ q, norms, out=np.zeros(block.shape[0], dtype=block.dtype), where=norms > 0)
+
+
+def _jensen_shannon(block, q):
+    """1 - Jensen-Shannon divergence (base 2) of every row of block and q, i.e., 1 is identical."""
+    m = 0.5 * (block + q)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(block > 0, block * np.log2(block / m), 0).sum(axis=1)
+        b = np.where(q > 0, q * np.log2(q / m), 0).sum(axis=1)
+    return 1 - 0.5 * (a + b)
+
+
+METRICS = {
+    'cosine': _cosine,
+    'jensen_shannon': _jensen_shannon,
+}
+
+
+def similar(topics, vector, k=10, metric='cosine', exclude=None, block_size=None):
+    """Return the k most similar documents to the topic vector as list of (id, similarity).
+
+    The dense topic matrix is searched in blocks of block_size rows, only the current best k survive each block,
+    so the temporary arrays do not grow with the number of documents.
+    """
+    block_size = block_size or settings.TOPIC_SIMILARITY_BLOCK_SIZE
+    score = METRICS[metric]
+    dense = topics.dense()
+    q = np.asarray(vector, dtype=np.float32)
+    if q.sum() > 0:
+        q = q / q.sum()
+
+    best_idx = np.empty(0, dtype=np.int64)
+    best_score = np.empty(0, dtype=np.float32)
+    for start in range(0, dense.shape[0], block_size):
+        s = score(dense[start:start + block_size], q)
+        if exclude is not None and start <= exclude < start + len(s):
+            s[exclude - start] = -np.inf
+
+        best_idx = np.concatenate([best_idx, np.arange(start, start + len(s))])
+        best_score = np.concatenate([best_score, s])
+        if len(best_score) > k:
+            top = np.argpartition(-best_score, k)[:k]
+            best_idx, best_score = best_idx[top], best_score[top]
+
+    order = np.argsort(-best_score, kind='mergesort')
+    return [(str(topics.ids[i]), float(best_score[j])) for j, i in zip(order, best_idx[order]) if np.isfinite(best_score[j])]
+
+
+def _documents(model, kind, after=None):
+    """Documents of the project of the TopicModel in id order, only those with an id greater than after."""
+    if kind == 'issue':
+        systems = [s.id for s in IssueSystem.objects.filter(project_id=model.project_id).only('id')]
+        qry = Issue.objects.filter(issue_system_id__in=systems).only('id', 'title', 'desc')
+    else:
+        lists = [m.id for m in MailingList.objects.filter(project_id=model.project_id).only('id')]
+        qry = Message.objects.filter(mailing_list_id__in=lists).only('id', 'subject', 'body')
+    if after:
+        qry = qry.filter(id__gt=after)
+    return qry.order_by('id').timeout(False)
+
+
+def _texts(model, kind, docs):
+    if kind == 'message':
+        return [str(m.subject) + " " + str(m.body) for m in docs]
+
+    comments = {i.id: [] for i in docs}
+    if model.config['issue_comments'] == 'true':
+        for c in IssueComment.objects.filter(issue_id__in=list(comments.keys())).only('issue_id', 'comment').as_pymongo():
+            comments[c['issue_id']].append(c.get('comment', None))
+    return [text.issue_text(i, comments[i.id]) for i in docs]
+
+
+def update(model, kind, full=False, batch_size=1000, n_jobs=1):
+    """Infer the topics of all documents of the project which are not in the store yet and save them.
+
+    Documents are processed in id order, so an incremental run only needs the documents with an id greater than the last stored one.
+    If the TopicModel changed everything is computed again. Returns the number of new documents.
+    """
+    lda, dic = topicmodel.load(model)
+    current = topicmodel.version(model)
+
+    topics = None if full else load(model, kind)
+    if topics is None:
+        topics = Topics(current, np.array([], dtype='<U24'), sp.csr_matrix((0, lda.num_topics)))
+
+    ids, rows = [], []
+    batch = []
+    for doc in _documents(model, kind, topics.last_id):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            ids += [str(d.id) for d in batch]
+            rows += topicmodel.infer(lda, [dic.doc2bow(d) for d in text.preprocess_all(_texts(model, kind, batch), n_jobs)])
+            batch = []
+    if batch:
+        ids += [str(d.id) for d in batch]
+        rows += topicmodel.infer(lda, [dic.doc2bow(d) for d in text.preprocess_all(_texts(model, kind, batch), n_jobs)])
+
+    if not ids:
+        return 0
+
+    data = [p for r in rows for t, p in r]
+    indices = [t for r in rows for t, p in r]
+    indptr = np.cumsum([0] + [len(r) for r in rows])
+    new = sp.csr_matrix((np.array(data, dtype=np.float32), np.array(indices, dtype=np.int32), indptr), shape=(len(rows), lda.num_topics))
+
+    Topics(current, np.concatenate([topics.ids, np.array(ids, dtype='<U24')]), sp.vstack([topics.matrix, new], format='csr')).save(path(model, kind))
+    return len(ids)
@@ -2,8 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import json
-import os
-import io
+import tempfile
 
 from datetime import datetime, date
 
@@ -11,7 +10,8 @@ import networkx as nx
 
 from django.contrib.auth import authenticate
 from django.conf import settings
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, FileResponse, Http404
+from django.shortcuts import get_object_or_404
 
 from rest_framework.views import APIView
 from rest_framework import exceptions
@@ -22,28 +22,26 @@ from rest_framework.decorators import detail_route, list_route
 from rest_framework import filters
 import django_filters
 
+from mongoengine.errors import ValidationError as MongoValidationError
 from mongoengine.queryset.visitor import Q
 
 from .models import Commit, Project, VCSSystem, IssueSystem, Token, People, FileAction, File, Tag, CodeEntityState, Issue, Message, MailingList, MynbouData, TravisBuild, TopicModel, IssueComment
 from .models import CommitGraph, CommitLabelField, ProjectStats, VSJob, VSJobType
 
 from .serializers import CommitSerializer, ProjectSerializer, VcsSerializer, IssueSystemSerializer, AuthSerializer, SingleCommitSerializer, FileActionSerializer, TagSerializer, CodeEntityStateSerializer, IssueSerializer, PeopleSerializer, MessageSerializer, SingleIssueSerializer, MailingListSerializer, FileSerializer
-from .serializers import CommitGraphSerializer, CommitLabelFieldSerializer, ProductSerializer, SingleMessageSerializer, VSJobSerializer
+from .serializers import CommitGraphSerializer, CommitLabelFieldSerializer, ProductSerializer, SingleMessageSerializer, VSJobSerializer, ProductMetadataSerializer
 
 from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Max, Sum
 from django.db.models.fields.reverse_related import ForeignObjectRel, OneToOneRel
 
 from rest_framework.filters import OrderingFilter
 
-from .util import prediction
-from .util.helper import tag_filter, OntdekBaan3 as OntdekBaan
-
-import gensim
-import string
-import re
-from nltk.corpus import stopwords
-from nltk.stem.porter import PorterStemmer
-from nltk.stem.wordnet import WordNetLemmatizer
+from .util import prediction, export, columnar, features, modelstore, products, topicmodel, text, topicstore, topicdiff, releases
+from .util.compression import precompressed_response
+from .util.conditional import conditional
+from .util.responses import spliced_json_response, file_response
+from .util.helper import OntdekBaan3 as OntdekBaan
 
 # from visibleSHARK.util.label import LabelPath
 # from mynbou.label import LabelPath
@@ -396,6 +394,55 @@ class MessageViewSet(MongoReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
+def _commit_graph_version(view, request, vcs_system_id=None):
+    cg = get_object_or_404(CommitGraph, vcs_system_id=vcs_system_id)
+    return '{}:{}'.format(cg.pk, cg.last_updated), cg.last_updated
+
+
+def _product_path_version(view, request, vcs_system_id=None):
+    seed, last_modified = _commit_graph_version(view, request, vcs_system_id)
+    product_ids = request.query_params.get('product_ids', None)
+    if product_ids:
+        for p in MynbouData.objects.filter(id__in=product_ids.split(',')).only('id', 'last_updated'):
+            seed += '|{}:{}'.format(p.id, p.last_updated)
+            if p.last_updated and (not last_modified or p.last_updated > last_modified):
+                last_modified = p.last_updated
+    return seed, last_modified
+
+
+def _product_version(view, request, id=None):
+    try:
+        p = MynbouData.objects.only('id', 'last_updated').get(id=id)
+    except (MynbouData.DoesNotExist, MongoValidationError):
+        raise Http404('No MynbouData matches the given query.')
+    return '{}:{}'.format(p.id, p.last_updated), p.last_updated
+
+
+def _release_version(view, request):
+    try:
+        return releases.fingerprint(request.GET.get('vcs_system_id', None))
+    except (VCSSystem.DoesNotExist, MongoValidationError):
+        raise Http404('No VCSSystem matches the given query.')
+
+
+# create_project_stats updates the rows of the current day in place, the sums change with them
+STATS_FIELDS = ('number_commits', 'number_issues', 'number_files', 'number_messages', 'number_people')
+
+
+def _stats_seed(qs):
+    aggregates = [Count('pk'), Max('pk'), Max('stats_date')] + [Sum(f) for f in STATS_FIELDS]
+    agg = qs.aggregate(*aggregates)
+    return '|'.join(str(agg[a.default_alias]) for a in aggregates)
+
+
+def _stats_version(view, request):
+    return _stats_seed(ProjectStats.objects.filter(stats_date=date.today())), None
+
+
+def _stats_history_version(view, request):
+    return _stats_seed(ProjectStats.objects.all()), None
+
+
 class CommitLabelFieldViewSet(rviewsets.ReadOnlyModelViewSet):
     queryset = CommitLabelField.objects.all()
     serializer_class = CommitLabelFieldSerializer
@@ -413,6 +460,14 @@ class CommitGraphViewSet(rviewsets.ReadOnlyModelViewSet):
     lookup_field = ('vcs_system_id')
     filter_fields = ('vcs_system_id')
 
+    @conditional(_commit_graph_version)
+    def retrieve(self, request, vcs_system_id=None):
+        """Return the commit graph, the stored JSON is streamed as is instead of being decoded and encoded again."""
+        cg = self.get_object()
+        envelope = {'id': cg.pk, 'vcs_system_id': cg.vcs_system_id, 'title': cg.title}
+        cg.directed_graph.open('rb')
+        return spliced_json_response(envelope, 'directed_graph', cg.directed_graph.file, cg.directed_graph.size)
+
     @detail_route(methods=['get'])
     def mark_nodes(self, request, vcs_system_id=None):
         """Generic node marker.
@@ -466,6 +521,7 @@ class CommitGraphViewSet(rviewsets.ReadOnlyModelViewSet):
         return Response({'results': response})
 
     @detail_route(methods=['get'])
+    @conditional(_commit_graph_version)
     def articulation_points(self, request, vcs_system_id=None):
         """Return list of nodes that are articulation points."""
         cg = CommitGraph.objects.get(vcs_system_id=vcs_system_id)
@@ -476,6 +532,14 @@ class CommitGraphViewSet(rviewsets.ReadOnlyModelViewSet):
         return Response({'results': mark})
 
     @detail_route(methods=['get'])
+    @conditional(_commit_graph_version)
+    def graph(self, request, vcs_system_id=None):
+        """Return only the raw commit graph JSON file, precompressed if possible."""
+        cg = CommitGraph.objects.get(vcs_system_id=vcs_system_id)
+        return precompressed_response(request, cg.directed_graph.path, 'application/json')
+
+    @detail_route(methods=['get'])
+    @conditional(_product_path_version)
     def product_path(self, request, vcs_system_id=None):
         """Return path for the approach used in this exact product."""
         cg = CommitGraph.objects.get(vcs_system_id=vcs_system_id)
@@ -489,13 +553,13 @@ class CommitGraphViewSet(rviewsets.ReadOnlyModelViewSet):
         dg = nx.read_gpickle(cg.directed_pickle.path)
 
         for product_id in product_ids.split(','):
-            p = MynbouData.objects.get(id=product_id)
+            p = MynbouData.objects.only('id', 'last_updated', 'vcs_system_id', 'name', 'file').get(id=product_id)
 
-            # extract approach, start and end commit
-            tmp = json.loads(p.file.read())
-            approach = tmp['label_path_approach']
-            start_commit = tmp['start_commit']
-            end_commit = tmp['end_commit']
+            # approach, start and end commit are taken from the metadata index
+            meta = products.metadata(p)
+            approach = meta.label_path_approach
+            start_commit = meta.start_commit
+            end_commit = meta.end_commit
 
             nodes = set()
             # import importlib
@@ -506,7 +570,7 @@ class CommitGraphViewSet(rviewsets.ReadOnlyModelViewSet):
                     nodes = nodes.union(set(path))
 
             resp['paths'].append(list(nodes))
-            resp['products'].append(p.name)
+            resp['products'].append(meta.name)
 
         return Response(resp)
 
@@ -542,18 +606,77 @@ class ProductViewSet(MongoReadOnlyModelViewSet):
     filter_fields = ('vcs_system_id',)
     ordering_fields = ('name',)
 
+    @list_route(methods=['get'])
+    def metadata(self, request):
+        """Return approach, commit range, number of rows, columns and size of the products without reading the product files."""
+        qry = self.filter_queryset(self.get_queryset()).only('id', 'last_updated', 'vcs_system_id', 'name', 'file')
+        page = self.paginate_queryset(qry)
+        serializer = ProductMetadataSerializer([products.metadata(p) for p in page], many=True)
+        return self.get_paginated_response(serializer.data)
+
     @detail_route(methods=['get'])
+    @conditional(_product_version)
     def file(self, request, id=None):
+        """Return the product file.
+
+        Without fields the stored JSON is streamed as is, with fields (comma separated) the rows are
+        decoded one by one and only the requested fields are returned.
+        """
         version = MynbouData.objects.get(id=id)
-        return Response(json.loads(version.file.read()))
+        fields = request.query_params.get('fields', None)
+
+        if fields:
+            ret = products.read_header(version)
+            ret['product'] = list(products.iter_rows(version, fields.split(',')))
+            return Response(ret)
+
+        f = version.file.get()
+        return StreamingHttpResponse(iter(lambda: f.read(settings.STREAM_CHUNK_SIZE), b''), content_type='application/json')
+
+    @detail_route(methods=['get'])
+    @conditional(_product_version)
+    def rows(self, request, id=None):
+        """Return one page of product rows, filtered and ordered on the cached feature matrix of the product.
+
+        Filters are long_name (prefix), label (true / false) and bugs_gt, ordering can be any metric column, long_name or bugs.
+        """
+        version = MynbouData.objects.only('id', 'last_updated', 'file').get(id=id)
+        matrix = features.load(version, mmap_mode='r')
+
+        label = request.query_params.get('label', None)
+        bugs_gt = request.query_params.get('bugs_gt', None)
+        try:
+            idx = matrix.select(long_name=request.query_params.get('long_name', None),
+                                label=None if label is None else label.lower() == 'true',
+                                bugs_gt=None if bugs_gt is None else float(bugs_gt),
+                                ordering=request.query_params.get('ordering', None))
+        except ValueError as e:
+            raise exceptions.ValidationError(str(e))
+
+        page = self.paginate_queryset(idx)
+        return self.get_paginated_response([matrix.row(i) for i in page])
 
     @detail_route(methods=['get'])
+    @conditional(_product_version)
     def file_download(self, request, id=None):
+        """Download the product file streamed from GridFS, supports byte ranges or gzip (gzip=true)."""
         version = MynbouData.objects.get(id=id)
-        f = io.BytesIO(version.file.read())
-        response = HttpResponse(f, content_type='application/json')
-        response['Content-Disposition'] = 'attachment; filename="{}.json"'.format(version.name)
-        return response
+        f = version.file.get()
+        gzip = request.query_params.get('gzip', 'false').lower() == 'true'
+        return file_response(request, f, f.length, 'application/json', '{}.json'.format(version.name), gzip=gzip)
+
+
+def _chunk_size(request):
+    """Optional chunk size for out-of-core training, only NB and LR support it."""
+    chunk_size = request.query_params.get('chunk_size', None)
+    if not chunk_size:
+        return None
+    if request.query_params.get('model', None) not in prediction.INCREMENTAL_CLASSIFIERS:
+        raise exceptions.ValidationError('chunk_size is only supported for {}'.format(', '.join(sorted(prediction.INCREMENTAL_CLASSIFIERS.keys()))))
+    try:
+        return max(1, int(chunk_size))
+    except ValueError:
+        raise exceptions.ValidationError('chunk_size needs to be a number')
 
 
 class PredictionEvaluationView(APIView):
@@ -563,17 +686,12 @@ class PredictionEvaluationView(APIView):
         test = request.query_params.get('test', None)
         model = request.query_params.get('model', None)
 
-        # 1. load files
-        train = []
-        te = []
-        for train_id in training.split(','):
-            train.append(json.loads(MynbouData.objects.get(id=train_id).file.read()))
-
-        for test_id in test.split(','):
-            te.append(json.loads(MynbouData.objects.get(id=test_id).file.read()))
+        # 1. fitted model (trained only once per training set) and test feature matrices
+        fitted = modelstore.fitted(training.split(','), model, chunk_size=_chunk_size(request))
+        te = features.load_products(test.split(','))
 
-        # 2. build model & evaluate
-        pred = prediction.predict_evaluate(train, te, model)
+        # 2. evaluate
+        pred = prediction.evaluate(fitted, te)
 
         return Response(pred)
 
@@ -584,18 +702,58 @@ class PredictionView(APIView):
         training = request.query_params.get('training', None)
         test = request.query_params.get('test', None)
         model = request.query_params.get('model', None)
+        probabilities = request.query_params.get('probabilities', 'false') == 'true'
+
+        # 1. fitted model (trained only once per training set) and test feature matrices
+        fitted = modelstore.fitted(training.split(','), model, chunk_size=_chunk_size(request))
+        te = features.load_products(test.split(','))
+
+        # 2. predict
+        pred = prediction.apply(fitted, te, probabilities=probabilities)
+
+        return Response(pred)
+
+
+class PredictionComparisonView(APIView):
+    """Compare multiple classifiers and hyperparameters on the same data.
+
+    Expects training and test (comma separated MynbouData ids), configurations (list of {model, params}),
+    optionally scheme (cross_version or kfold), folds and n_jobs.
+    """
+
+    def post(self, request):
+        training = request.data.get('training', None)
+        test = request.data.get('test', '')
+        configurations = request.data.get('configurations', [])
+        scheme = request.data.get('scheme', 'cross_version')
 
-        # 1. load files
-        train = []
-        te = []
-        for train_id in training.split(','):
-            train.append(json.loads(MynbouData.objects.get(id=train_id).file.read()))
+        if not training or not configurations:
+            raise exceptions.ValidationError('need training and configurations')
+        if scheme not in ('cross_version', 'kfold'):
+            raise exceptions.ValidationError('unknown scheme {}'.format(scheme))
+        if scheme == 'cross_version' and not test:
+            raise exceptions.ValidationError('need test for cross_version')
 
-        for test_id in test.split(','):
-            te.append(json.loads(MynbouData.objects.get(id=test_id).file.read()))
+        try:
+            folds = int(request.data.get('folds', 10))
+            n_jobs = min(int(request.data.get('n_jobs', 1)), settings.PREDICTION_MAX_JOBS)
+        except ValueError:
+            raise exceptions.ValidationError('folds and n_jobs need to be numbers')
+
+        try:
+            prediction.validate(configurations, scheme, folds)
+        except ValueError as e:
+            raise exceptions.ValidationError('invalid configuration: {}'.format(e))
 
-        # 2. build model & predict
-        pred = prediction.predict(train, te, model)
+        # 1. load feature matrices once for every configuration
+        train = features.load_products(training.split(','))
+        te = features.load_products(test.split(',')) if test else []
+
+        # 2. fit & score every configuration, some combinations of hyperparameters (or too many folds) only fail while fitting
+        try:
+            pred = prediction.compare(train, te, configurations, scheme, folds, n_jobs)
+        except ValueError as e:
+            raise exceptions.ValidationError('invalid configuration: {}'.format(e))
 
         return Response(pred)
 
@@ -603,6 +761,7 @@ class PredictionView(APIView):
 class StatsView(APIView):
     # TODO: update to serializer
 
+    @conditional(_stats_version)
     def get(self, request):
         projects = {}
         for pro in ProjectStats.objects.filter(stats_date=date.today()):
@@ -618,6 +777,7 @@ class StatsView(APIView):
 class StatsHistoryView(APIView):
     # TODO: update to serializer
 
+    @conditional(_stats_history_version)
     def get(self, request):
         history = []
         for pro in ProjectStats.objects.values('stats_date').distinct().order_by('stats_date'):
@@ -634,6 +794,7 @@ class StatsHistoryView(APIView):
 
 class ReleaseView(APIView):
 
+    @conditional(_release_version)
     def get(self, request):
         vcs_system_id = request.GET.get('vcs_system_id', None)
         discard_qualifiers = request.GET.get('discard_qualifiers', True)
@@ -642,7 +803,7 @@ class ReleaseView(APIView):
         discard_qualifiers = discard_qualifiers == 'true'
         discard_patch = discard_patch == 'true'
 
-        versions = tag_filter(Tag.objects.filter(vcs_system_id=vcs_system_id), discard_qualifiers=discard_qualifiers, discard_patch=discard_patch)
+        versions = releases.releases(vcs_system_id, discard_qualifiers=discard_qualifiers, discard_patch=discard_patch)
         history = {'count': len(versions), 'results': versions}
         # print(history)
         return Response(history)
@@ -657,50 +818,19 @@ class TopicModelView(APIView):
         response = { 'models': topicModels }
         return Response(response)
 
-    def loadTopic(self, topic_id, model):
-        folder = "tmp/" + topic_id + "/"
-        need_load = False
-        clear_cache = False
-
-        if not os.path.exists(folder):
-           os.makedirs(folder)
-           need_load = True  
-        if need_load:
-           lda = open(folder + 'topic.model','wb')
-           lda.write(model.lda.read())
-           lda.close()   
-           lda_id2word = open(folder + 'topic.model.id2word','wb')
-           lda_id2word.write(model.lda_id2word.read())
-           lda_id2word.close()
-           lda_state = open(folder + 'topic.model.state','wb')
-           lda_state.write(model.lda_state.read())
-           lda_state.close()
-           lda_expElogbeta = open(folder + 'topic.model.expElogbeta.npy','wb')
-           lda_expElogbeta.write(model.lda_expElogbeta.read())
-           lda_expElogbeta.close()
-        return gensim.models.LdaModel.load(folder + 'topic.model')
-
     def post(self, request):     
         model_id = request.data["id"]          
         model = TopicModel.objects.get(id=model_id)
 
         # part 2
-        lda = self.loadTopic(model_id, model)
+        lda, dic = topicmodel.load(model)
 
         topics = []
         for i in range(0, lda.num_topics):
             topic = { 'id' : i , 'description': lda.print_topic(i) }
             topics.append(topic)
         
-        #part 3        
-      #  for m in TopicModel.objects.filter(project_id=model.project_id):
-       #     print("Vergleiche: ")
-        #    print(model_id)
-         #   print(m.id)
-         #   print(m.config)
-         #   lda2 = self.loadTopic(str(m.id), m)
-         #   mdiff, annotation = lda.diff(lda2, "jensen_shannon")
-         #   print(mdiff)
+        # part 3, the comparison with the other models of the project is done by the compare_topic_models job, see TopicModelDiffView
 
         response = { 'data': model.view.read(), 'table' : topics }
         return Response(response)
@@ -709,74 +839,21 @@ class TopicModelView(APIView):
         model_id = request.data["id"] 
         commit_id = request.data["issueId"]  
         
-        folder = "tmp/" + model_id + "/"
-        need_load = False
-        clear_cache = False
-
-        if not os.path.exists(folder):
-           os.makedirs(folder)
-           need_load = True       
-        
         model = TopicModel.objects.get(id=model_id)
+        lda, dic = topicmodel.load(model)
 
-        if need_load:
-           # Load objects form db and save local
-           dic = open(folder + 'dic.dict','wb')
-           dic.write(model.dic.read())
-           dic.close()
-       
-           #LDA
-           lda = open(folder + 'topic.model','wb')
-           lda.write(model.lda.read())
-           lda.close()   
-           lda_id2word = open(folder + 'topic.model.id2word','wb')
-           lda_id2word.write(model.lda_id2word.read())
-           lda_id2word.close()
-           lda_state = open(folder + 'topic.model.state','wb')
-           lda_state.write(model.lda_state.read())
-           lda_state.close()
-           lda_expElogbeta = open(folder + 'topic.model.expElogbeta.npy','wb')
-           lda_expElogbeta.write(model.lda_expElogbeta.read())
-           lda_expElogbeta.close()
-
-
-        dic = gensim.corpora.Dictionary.load(folder + 'dic.dict') 
-        lda = gensim.models.LdaModel.load(folder + 'topic.model')
-        
-        if clear_cache:
-           os.remove(folder + 'dic.dict') 
-           os.remove(folder + 'topic.model')
-           os.remove(folder + 'topic.model.id2word')
-           os.remove(folder + 'topic.model.state')
-           os.remove(folder + 'topic.model.expElogbeta.npy')
+        # precomputed by the precompute_topics command
+        topics = topicstore.lookup(model, 'issue', commit_id)
 
         ## Evaluate the issue
-        issue = Issue.objects.get(id=commit_id)
-        s = str(issue.title) + " " + str(issue.desc)
-        if model.config['issue_comments'] == 'true':
-           for issue_comment in IssueComment.objects.filter(issue_id=issue.id):
-               s += str(issue_comment.comment)
-        # Clean s
-        whitelist = set("abcdefghijklmnopqrstuvwxy ABCDEFGHIJKLMNOPQRSTUVWXYZ?.!'")
-        stopword = set(stopwords.words('english'))
-        punctuation = set(string.punctuation) 
-        lemmatize = WordNetLemmatizer()
-        
-        # Remove URLS
-        s = re.sub(r'^https?:\/\/.*[\r\n]*', '', s, flags=re.MULTILINE);
-        s = s.replace('\r\n',' ');
-        s = s.replace('\n',' ');
-        # Only words..
-        s = ''.join(filter(whitelist.__contains__, s));
-        # Rest
-        s = " ".join([i for i in s.lower().split() if i not in stopword])  
-        s = " ".join(lemmatize.lemmatize(i) for i in s.split())  
-        s = "".join(i for i in s if i not in punctuation)
-        # Words with size 2 or less makes no sense
-        s = " ".join([w for w in s.split() if len(w)>2])
-        s = s.split()        
-        s = dic.doc2bow(s)
-        topics = lda[s]
+        if topics is None:
+            issue = Issue.objects.get(id=commit_id)
+            comments = []
+            if model.config['issue_comments'] == 'true':
+                comments = [c.comment for c in IssueComment.objects.filter(issue_id=issue.id)]
+            s = text.preprocess(text.issue_text(issue, comments))
+            s = dic.doc2bow(s)
+            topics = lda[s]
         result_topics = []
         for topic in topics:
             result_topics.append({ "id" : topic[0], "score" : topic[1], "topicPrint" : lda.print_topic(topic[0]) })
@@ -786,6 +863,173 @@ class TopicModelView(APIView):
         response = { 'evaluation': result_topics }
         return Response(response)
 
+class TopicModelBatchView(APIView):
+    """Topic distributions of many issues at once.
+
+    Expects the id of the TopicModel and either a list of issueIds or an issue_system_id.
+    """
+
+    def post(self, request):
+        model_id = request.data.get('id', None)
+        issue_ids = request.data.get('issueIds', None)
+        issue_system_id = request.data.get('issue_system_id', None)
+
+        if not model_id or not (issue_ids or issue_system_id):
+            raise exceptions.ValidationError('need id and issueIds or issue_system_id')
+
+        model = TopicModel.objects.get(id=model_id)
+        lda, dic = topicmodel.load(model)
+
+        if issue_ids:
+            issues = list(Issue.objects.filter(id__in=issue_ids).only('id', 'title', 'desc'))
+        else:
+            issues = list(Issue.objects.filter(issue_system_id=issue_system_id).only('id', 'title', 'desc'))
+
+        comments = {i.id: [] for i in issues}
+        if model.config['issue_comments'] == 'true':
+            for c in IssueComment.objects.filter(issue_id__in=list(comments.keys())).only('issue_id', 'comment').as_pymongo():
+                comments[c['issue_id']].append(c.get('comment', None))
+
+        docs = text.preprocess_all([text.issue_text(i, comments[i.id]) for i in issues], settings.TOPIC_MODELS['preprocess_jobs'])
+        distributions = topicmodel.infer(lda, [dic.doc2bow(d) for d in docs])
+
+        evaluation = {}
+        used = set()
+        for issue, topics in zip(issues, distributions):
+            evaluation[str(issue.id)] = [{'id': t, 'score': score} for t, score in topics]
+            used.update(t for t, score in topics)
+
+        response = {'evaluation': evaluation, 'topics': {t: lda.print_topic(t) for t in sorted(used)}}
+        return Response(response)
+
+
+class TopicModelSimilarityView(APIView):
+    """Issues most similar to an issue in the topic space of a TopicModel.
+
+    Requires the topic distributions precomputed by the precompute_topics command, metric is cosine or jensen_shannon.
+    """
+
+    def get(self, request):
+        model_id = request.query_params.get('id', None)
+        issue_id = request.query_params.get('issueId', None)
+        metric = request.query_params.get('metric', 'cosine')
+
+        if not model_id or not issue_id:
+            raise exceptions.ValidationError('need id and issueId')
+        if metric not in topicstore.METRICS:
+            raise exceptions.ValidationError('unknown metric {}'.format(metric))
+        try:
+            k = max(1, min(int(request.query_params.get('k', 10)), 1000))
+        except ValueError:
+            raise exceptions.ValidationError('k needs to be a number')
+
+        model = TopicModel.objects.get(id=model_id)
+        topics = topicstore.load(model, 'issue')
+        if topics is None:
+            raise exceptions.NotFound('no precomputed topics for this model')
+        i = topics.index(issue_id)
+        if i is None:
+            raise exceptions.NotFound('issue has no precomputed topics')
+
+        results = topicstore.similar(topics, topics.dense()[i], k, metric, exclude=i)
+
+        issues = {str(d.id): d for d in Issue.objects.filter(id__in=[r[0] for r in results]).only('id', 'external_id', 'title')}
+        response = {'results': [{'id': doc_id, 'external_id': issues[doc_id].external_id, 'title': issues[doc_id].title, 'score': score} for doc_id, score in results if doc_id in issues]}
+        return Response(response)
+
+
+class TopicModelDiffView(APIView):
+    """Topic diff matrices between a TopicModel and the other models of its project.
+
+    The matrices are computed by the compare_topic_models job, models without a matrix are listed as missing.
+    """
+
+    def get(self, request):
+        model_id = request.query_params.get('id', None)
+        distance = request.query_params.get('distance', 'jensen_shannon')
+
+        if not model_id:
+            raise exceptions.ValidationError('need id')
+        if distance not in topicdiff.DISTANCES:
+            raise exceptions.ValidationError('unknown distance {}'.format(distance))
+
+        model = TopicModel.objects.get(id=model_id)
+        diffs = []
+        missing = []
+        for other in TopicModel.objects.filter(project_id=model.project_id):
+            if other.id == model.id:
+                continue
+            mdiff = topicdiff.read(model, other, distance)
+            if mdiff is None:
+                missing.append(str(other.id))
+            else:
+                diffs.append({'id': str(other.id), 'name': other.name, 'matrix': mdiff.tolist()})
+
+        response = {'diffs': diffs, 'missing': missing}
+        return Response(response)
+
+
+class ExportView(APIView):
+    """Streams all documents of a collection for a VCS system as NDJSON or CSV in one request.
+
+    Supported collections are commit, fileaction and codeentitystate, the format is selected with output=ndjson|csv.
+    """
+
+    def get(self, request, collection):
+        vcs_system_id = request.query_params.get('vcs_system_id', None)
+        output = request.query_params.get('output', 'ndjson')
+
+        if collection not in export.EXPORTS:
+            raise exceptions.NotFound('unknown collection {}'.format(collection))
+        if output not in export.FORMATS:
+            raise exceptions.ValidationError('unknown output {}'.format(output))
+        if not vcs_system_id:
+            raise exceptions.ValidationError('need vcs_system_id')
+
+        try:
+            batch_size = int(request.query_params.get('batch_size', settings.EXPORT['batch_size']))
+        except ValueError:
+            raise exceptions.ValidationError('batch_size needs to be a number')
+        batch_size = max(1, min(batch_size, settings.EXPORT['max_batch_size']))
+
+        response = StreamingHttpResponse(export.export(collection, vcs_system_id, output, batch_size), content_type=export.FORMATS[output])
+        response['Content-Disposition'] = 'attachment; filename="{}_{}.{}"'.format(collection, vcs_system_id, output)
+        return response
+
+
+class MetricsExportView(APIView):
+    """Returns the CodeEntityState metrics of a commit or commit range as Parquet or Arrow file.
+
+    Every metric is a column, the commit range is given by commit and optionally end_commit (revision hashes).
+    """
+
+    def get(self, request):
+        vcs_system_id = request.query_params.get('vcs_system_id', None)
+        commit = request.query_params.get('commit', None)
+        end_commit = request.query_params.get('end_commit', None)
+        output = request.query_params.get('output', 'parquet')
+
+        if columnar.pa is None:
+            raise exceptions.APIException('pyarrow is required for columnar exports')
+        if output not in columnar.OUTPUTS:
+            raise exceptions.ValidationError('unknown output {}'.format(output))
+        if not vcs_system_id or not commit:
+            raise exceptions.ValidationError('need vcs_system_id and commit')
+
+        commit_ids = columnar.commit_range(vcs_system_id, commit, end_commit)
+
+        # parquet writes its footer last, so we spool to a temporary file and stream that
+        f = tempfile.TemporaryFile()
+        columnar.write_metrics(f, commit_ids, output, settings.EXPORT['row_group_size'])
+        size = f.tell()
+        f.seek(0)
+
+        response = FileResponse(f, content_type=columnar.OUTPUTS[output])
+        response['Content-Length'] = size
+        response['Content-Disposition'] = 'attachment; filename="metrics_{}.{}"'.format(commit, output)
+        return response
+
+
 class VSJobViewSet(rviewsets.ModelViewSet):
     """Job information."""
 
@@ -854,6 +1098,45 @@ class VSJobViewSet(rviewsets.ModelViewSet):
 
         return HttpResponse(status=202)
 
+    @list_route(methods=['post'])
+    def compare_topic_models(self, request, pk=None):
+        """Compare all TopicModels of a project pairwise in the worker.
+
+        Expects project_id and optionally distance, the matrices are read with analytics/topicmodeldiff.
+        """
+        dat = request.data
+        jt = VSJobType.objects.get(ident='compare_topic_models')
+        j = VSJob(job_type=jt, requested_by=request.user)
+        j.data = json.dumps(dat)
+        j.save()
+
+        return HttpResponse(status=202)
+
+    @list_route(methods=['post'])
+    def predict(self, request, pk=None):
+        """Fit and predict in the worker, the result is stored in the job.
+
+        Expects training and test (comma separated MynbouData ids), model and optionally probabilities.
+        """
+        dat = request.data
+        jt = VSJobType.objects.get(ident='predict')
+        j = VSJob(job_type=jt, requested_by=request.user)
+        j.data = json.dumps(dat)
+        j.save()
+
+        return HttpResponse(status=202)
+
+    @list_route(methods=['post'])
+    def predict_evaluate(self, request, pk=None):
+        """Fit and evaluate in the worker, the result is stored in the job."""
+        dat = request.data
+        jt = VSJobType.objects.get(ident='predict_evaluate')
+        j = VSJob(job_type=jt, requested_by=request.user)
+        j.data = json.dumps(dat)
+        j.save()
+
+        return HttpResponse(status=202)
+
     @list_route(methods=['post'])
     def test_connection_worker(self, request, pk=None):
         dat = request.data